@@ -11,8 +11,12 @@ Created on Mon Apr 15 13:55:41 2019
 __author__ = 'Caleb Andrade'
 
 import os
+import sys
 import glob
 import csv 
+from collections.abc import MutableMapping
+
+import numpy as np
 
 #******************************************************************************
 # HELPER FUNCTIONS
@@ -46,38 +50,51 @@ NUTRIENTS = ['agua',
              'acido_folico', 
              'folato'
             ]
+
+NUTRIENT_INDEX = dict((nutrient, i) for i, nutrient in enumerate(NUTRIENTS))
+
+# Encoding of the csv files exported by the kitchen system
+ENCODING = 'latin-1'
              
 
-def readRecipee(filename):
+def parseRecipee(name, lines):
     """
-    Reads a recipee from a csv file.
+    Parses a recipee from the lines of its csv file.
     """
     
-    name = filename[:-4] # Extracting recipee's name
     ingredients = []
-       
-    with open(filename) as csv_file:
-        csv_reader = csv.reader(csv_file, delimiter = ",")
-        line_count = 0
+    csv_reader = csv.reader(lines, delimiter = ",")
+    line_count = 0
         
-        for row in csv_reader:
-            if line_count == 0:
-                servings = int(row[1])
-                line_count += 1
-            elif line_count == 1:
-                grams = float(row[1])
-                line_count += 1
-            elif line_count == 2:
-                classification = [int(x) for x in row[1:-1]]
-                line_count += 1
-            elif line_count == 3:
-                line_count += 1
-            else:
-                ingredients.append(row)
+    for row in csv_reader:
+        if line_count == 0:
+            servings = int(row[1])
+            line_count += 1
+        elif line_count == 1:
+            grams = float(row[1])
+            line_count += 1
+        elif line_count == 2:
+            classification = [int(x) for x in row[1:-1]]
+            line_count += 1
+        elif line_count == 3:
+            line_count += 1
+        else:
+            ingredients.append(row)
                             
     return name, servings, grams, classification, ingredients
 
 
+def readRecipee(filename, encoding = ENCODING):
+    """
+    Reads a recipee from a csv file.
+    """
+    
+    name = os.path.basename(filename)[:-4] # Extracting recipee's name
+       
+    with open(filename, encoding = encoding, newline = '') as csv_file:
+        return parseRecipee(name, csv_file)
+
+
 def convert(string):
     """
     Converts a string into a float.
@@ -87,7 +104,7 @@ def convert(string):
     return float(string)
 
 
-def foodTable(filename):
+def foodTable(filename, encoding = ENCODING):
     """
     Reads food composition table and builds a dictionary.
     Keys are food ingredients, values are nutrients vectors.
@@ -96,7 +113,7 @@ def foodTable(filename):
     
     nutrients = {}
     
-    with open(filename) as csv_file:
+    with open(filename, encoding = encoding, newline = '') as csv_file:
         csv_reader = csv.reader(csv_file, delimiter = ",")
         line_count = 0
         
@@ -109,7 +126,7 @@ def foodTable(filename):
     return nutrients
 
 
-def costTable(filename):
+def costTable(filename, encoding = ENCODING):
     """
     Reads food costs from a table and builds a dictionary.
     Keys are food ingredients, values is a vector [food costs, grams]
@@ -117,7 +134,7 @@ def costTable(filename):
     
     costs = {}
     
-    with open(filename) as csv_file:
+    with open(filename, encoding = encoding, newline = '') as csv_file:
         csv_reader = csv.reader(csv_file, delimiter = ",")
         
         for row in csv_reader:
@@ -129,58 +146,136 @@ def costTable(filename):
 def nutrientCalculator(recipees):
     """
     Computes the overall nutrients values for a set of recipees.
+    For many menus at once see evaluation.scoreMenus.
     """
     
-    nutrients_sum = {}
-    
-    for i in range (len(NUTRIENTS)):
-        nutrients_sum[NUTRIENTS[i]] = 0
-        
-    for nutrient in NUTRIENTS:
-        for recipee in recipees:
-            nutrients_sum[nutrient] += recipee.nutrients[nutrient]
+    values = np.array([recipee.values for recipee in recipees], dtype = float)
+    nutrients_sum = values.reshape(-1, len(NUTRIENTS)).sum(axis = 0)
             
-    return nutrients_sum    
+    return dict(zip(NUTRIENTS, nutrients_sum.tolist()))
  
         
 #******************************************************************************
 # RECIPEE CLASS
 #******************************************************************************
 
+class Nutrients(MutableMapping):
+    """
+    Dictionary view (nutrient -> value) of a recipee's nutrient vector.
+    Reads and writes go to the vector.
+    """
+
+    __slots__ = ('values',)
+
+    def __init__(self, values):
+        self.values = values
+
+    def __getitem__(self, nutrient):
+        return float(self.values[NUTRIENT_INDEX[nutrient]])
+
+    def __setitem__(self, nutrient, value):
+        self.values[NUTRIENT_INDEX[nutrient]] = value
+
+    def __delitem__(self, nutrient):
+        raise TypeError("Nutrients cannot be removed")
+
+    def __iter__(self):
+        return iter(NUTRIENTS)
+
+    def __len__(self):
+        return len(NUTRIENTS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
 class Recipee:
     """
-    Class to contain a dish recipee.
+    Class to contain a dish recipee. Nutrients per serving are one float64
+    vector following NUTRIENTS (a row of the catalog matrix when computed by
+    the batch engine); ingredients are a tuple of food names and a vector of
+    grams.
     """
     
-    def __init__(self, filename, food_table, cost_table):
+    __slots__ = ('name', 'servings', 'grams', 'classification', 'foods',
+                 'quantities', 'values', 'cost')
+    
+    def __init__(self, filename, food_table, cost_table, nutrients = True,
+                 cost = True):
         """
         Initialize a recipee.
-        Input: csv file with a recipee, nutrients food table, food cost table.
+        Input: csv file with a recipee (or a record as returned by
+        readRecipee), nutrients food table, food cost table.
+        If nutrients is False, nutrients are left at zero to be filled in
+        by the batch engine (see nutrient_matrix.catalogNutrients).
+        If cost is False, cost is left at zero.
         """
         
-        temp_recipee = readRecipee(filename)
+        if isinstance(filename, str):
+            temp_recipee = readRecipee(filename)
+        else:
+            temp_recipee = filename
         
         self.name = temp_recipee[0]
         self.servings = temp_recipee[1]
         self.grams = temp_recipee[2]
         self.classification = temp_recipee[3]
-        self.ingredients = {}
         
+        # Repeated ingredients keep the last quantity, as a dictionary would
+        ingredients = {}
         for ingredient in temp_recipee[4]:
-            self.ingredients[ingredient[3]] = float(ingredient[2])
-        
-        self.number_ingredients = len(self.ingredients)
+            ingredients[sys.intern(ingredient[3])] = float(ingredient[2])
+        self.foods = tuple(ingredients)
+        self.quantities = np.array(list(ingredients.values()), dtype = float)
         
         # Initializing nutrients values
-        self.nutrients = {}
-        for i in range (len(NUTRIENTS)):
-            self.nutrients[NUTRIENTS[i]] = 0
+        self.values = np.zeros(len(NUTRIENTS))
             
         # Computing nutrients values
-        self.recipeeNutrients(food_table)
+        if nutrients:
+            self.recipeeNutrients(food_table)
         
         # Computing cost of recipee
-        self.cost = self.recipeeCost(cost_table)
+        self.cost = 0
+        if cost:
+            self.cost = self.recipeeCost(cost_table)
+    
+    
+    @property
+    def nutrients(self):
+        """
+        Nutrients per serving as a dictionary view of the nutrient vector.
+        """
+        return Nutrients(self.values)
+    
+    
+    @nutrients.setter
+    def nutrients(self, nutrients):
+        """
+        Sets nutrients from a dictionary, or shares a vector (e.g. a row of
+        the catalog matrix).
+        """
+        
+        if isinstance(nutrients, np.ndarray):
+            self.values = nutrients
+        else:
+            self.values = np.array([nutrients.get(n, 0) for n in NUTRIENTS], dtype = float)
+    
+    
+    @property
+    def ingredients(self):
+        """
+        Ingredients as a dictionary food -> grams.
+        """
+        return dict(zip(self.foods, self.quantities.tolist()))
+    
+    
+    @property
+    def number_ingredients(self):
+        """
+        Number of ingredients.
+        """
+        return len(self.foods)
         
    
     def __str__(self):
@@ -203,14 +298,13 @@ class Recipee:
         Computes nutrients of recipee.
         """
   
-        for i in range(len(NUTRIENTS)):
-            for ingredient in self.ingredients.keys():
-                # Compute nutrient value for each ingredient in recipee, add it up.
-                if ingredient in food_table:
-                    value = food_table[ingredient][i]*self.ingredients[ingredient]/100
-                    self.nutrients[NUTRIENTS[i]] += value/self.servings
-                else:
-                    print "No food ", ingredient, " was found"
+        for ingredient, quantity in zip(self.foods, self.quantities.tolist()):
+            # Compute nutrient values for each ingredient in recipee, add them up.
+            if ingredient in food_table:
+                row = food_table[ingredient][:len(NUTRIENTS)]
+                self.values[:len(row)] += np.asarray(row, dtype = float)*quantity/100/self.servings
+            else:
+                print("No food %s was found" % ingredient)
     
     
     def recipeeCost(self, cost_table):
@@ -220,13 +314,13 @@ class Recipee:
     
         cost = 0
     
-        for ingredient in self.ingredients:
+        for ingredient, quantity in zip(self.foods, self.quantities.tolist()):
             if ingredient in cost_table:
                 food_cost = cost_table[ingredient][0]
                 grams = cost_table[ingredient][1]
-                cost += food_cost*self.ingredients[ingredient]/grams
+                cost += food_cost*quantity/grams
             else:
-                 print "No cost of ", ingredient, " was found"
+                 print("No cost of %s was found" % ingredient)
             
         return round(cost/self.servings, 2)
     
@@ -255,25 +349,37 @@ class Recipee:
 # TESTING
 #******************************************************************************
 
-def recipeeBuilder():
+PATH = r"C:\Users\caleb\Documents\DOCTORADO UNAM\FUNSALUD\PLANEACION DE MENU"
+RECETARIO = 'RECETARIO'
+FOOD_TABLE = 'tabla_composicion_alimentos.csv'
+COST_TABLE = 'tabla_costos_alimentos.csv'
+CACHE = 'recetario_compilado.npz'
+
+
+def recipeeBuilder(path = PATH, cache = CACHE, recetario = RECETARIO):
     """
     Builds a list of recipees.
+    Input: directory with the food tables and the recipee book, compiled
+    catalog file inside it (None to parse every recipee), recipee book
+    (directory, zip or tar archive).
     """
-   
-    os.chdir("C:\Users\caleb\Documents\DOCTORADO UNAM\FUNSALUD\PLANEACION DE MENU")
-    food_table = foodTable('tabla_composicion_alimentos.csv')
-    cost_table = costTable('tabla_costos_alimentos.csv')
     
+    from recipee_stream import recipeeChunks
     
-    os.chdir("C:\Users\caleb\Documents\DOCTORADO UNAM\FUNSALUD\PLANEACION DE MENU\RECETARIO")
-
-    extension = 'csv'
-    all_filenames = [x for x in glob.glob('*.{}'.format(extension))]
+    source = os.path.join(path, recetario)
+    
+    if cache is not None and os.path.isdir(source):
+        from catalog_cache import compiledBuilder
+        return compiledBuilder(path, os.path.join(path, cache), recetario)
+   
+    food_table = foodTable(os.path.join(path, FOOD_TABLE))
+    cost_table = costTable(os.path.join(path, COST_TABLE))
     
     recipees = []
     
-    for filename in all_filenames:
-        recipees.append(Recipee(filename, food_table, cost_table))
+    # Recipees are streamed, nutrients are computed a chunk at a time
+    for chunk in recipeeChunks(source, food_table, cost_table):
+        recipees.extend(chunk)
         
     return recipees, food_table, cost_table
 
@@ -305,7 +411,8 @@ def main():
 #            print nutrient, ": ", nutrients_sum[nutrient]
         
     
-main()
+if __name__ == '__main__':
+    main()
     
     
     
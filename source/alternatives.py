@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+K-best alternative menus for rotation. On Gurobi the solution pool
+(PoolSearchMode 2) returns the K best menus from one search. Otherwise the
+menus are enumerated by partitioning (Lawler): once the best menu of a region
+is taken, the rest of the region is split into subregions by fixing
+variables, each solved only when its parent's bound reaches the top of the
+queue. Subregions only change variable bounds, so their relaxations stay as
+tight as the original model's.
+
+With a minimum Hamming distance between menus, a no-good cut is added after
+every solve,
+
+    sum_{i in S} (1 - buy[i]) + sum_{i not in S} buy[i] >= distance,
+
+which removes menu S and every menu within distance - 1 of it. The matrix
+model is built once; cuts are appended to it (to the live gurobipy model on
+Gurobi) instead of rebuilding it for every alternative.
+"""
+
+import copy
+import time
+import heapq
+
+import numpy as np
+from scipy import sparse
+
+from solver import getBackend, Solution, OPTIMAL, TIME_LIMIT, MAXIMIZE
+
+#******************************************************************************
+# HELPER FUNCTIONS
+#******************************************************************************
+
+def noGoodCut(x, distance = 1, tolerance = 0.5):
+    """
+    Returns the no-good cut of a binary solution as (row, lower bound).
+    """
+
+    support = np.asarray(x) > tolerance
+    row = np.where(support, -1.0, 1.0)
+    return row, distance - float(support.sum())
+
+
+def hamming(x, y, tolerance = 0.5):
+    """
+    Returns the number of variables where two binary solutions differ.
+    """
+    return int(np.count_nonzero((np.asarray(x) > tolerance) != (np.asarray(y) > tolerance)))
+
+
+def checkBinary(model):
+    """
+    Raises ValueError if the model has non binary variables.
+    """
+
+    if not (np.all(model.integrality > 0) and np.all(model.lb == 0)
+            and np.all(model.ub == 1)):
+        raise ValueError("Alternative menus need a binary model (mip, mip2, mip3)")
+
+
+def ranked(solutions, sense):
+    """
+    Sorts solutions by objective value.
+    """
+    return sorted(solutions, key = lambda s: -s.objVal if sense == MAXIMIZE else s.objVal)
+
+#******************************************************************************
+# ENUMERATION
+#******************************************************************************
+
+def poolAlternatives(model, k, time_limit = None, verbose = False):
+    """
+    K best menus from the Gurobi solution pool (one search).
+    Output: list of Solutions.
+    """
+
+    backend = getBackend('gurobi')
+
+    t = time.time()
+    m, x = backend.build(model, verbose)
+    build_time = time.time() - t
+
+    m.Params.PoolSearchMode = 2
+    m.Params.PoolSolutions = k
+    if time_limit is not None:
+        m.Params.TimeLimit = time_limit
+
+    t = time.time()
+    m.optimize()
+    solve_time = time.time() - t
+
+    status = backend.solution(m, x, build_time, solve_time).status
+    solutions = []
+
+    for i in range(m.SolCount):
+        m.Params.SolutionNumber = i
+        solutions.append(Solution(status, np.asarray(x.Xn), m.PoolObjVal,
+                                  build_time, solve_time, backend.name))
+
+    return solutions
+
+
+def subproblem(model, lb, ub, covers):
+    """
+    Returns a copy of the model with variable bounds lb, ub and a row
+    sum(buy[cover]) >= 1 for every cover (list of variable indices).
+    """
+
+    sub = copy.copy(model)
+    sub.lb = lb
+    sub.ub = ub
+
+    if covers:
+        rows = np.zeros((len(covers), model.numVars()))
+        for i, cover in enumerate(covers):
+            rows[i, cover] = 1.0
+        sub.A = sparse.vstack([model.A, sparse.csr_matrix(rows)], format = 'csr')
+        sub.row_lower = np.concatenate([model.row_lower, np.ones(len(covers))])
+        sub.row_upper = np.concatenate([model.row_upper, np.full(len(covers), np.inf)])
+
+    return sub
+
+
+def partitionAlternatives(model, k, backend = 'highs', time_limit = None,
+                          verbose = False):
+    """
+    K best menus by partitioning the feasible region.
+    Input: binary matrix model, number of menus, solver backend, time limit
+    per solve.
+    Output: list of Solutions, best first.
+    """
+
+    backend = getBackend(backend)
+    sign = -1.0 if model.sense == MAXIMIZE else 1.0
+
+    # Queue entries: (bound, tie breaker, lb, ub, covers, solution or None)
+    queue = [(-np.inf, 0, model.lb.copy(), model.ub.copy(), [], None)]
+    count = 0
+    solutions = []
+
+    while queue and len(solutions) < k:
+        bound, tie, lb, ub, covers, solution = heapq.heappop(queue)
+
+        # Solve the region, queue it again with its own objective
+        if solution is None:
+            solution = backend.solve(subproblem(model, lb, ub, covers),
+                                     time_limit = time_limit, verbose = verbose)
+            if solution.status in (OPTIMAL, TIME_LIMIT) and solution.x is not None:
+                count += 1
+                heapq.heappush(queue, (sign*solution.objVal, count, lb, ub,
+                                       covers, solution))
+            continue
+
+        solutions.append(solution)
+
+        # Split the rest of the region: the j-th free selected variable is 0
+        # and the previous ones are 1, or all of them are 1 and some free
+        # unselected variable is 1
+        chosen = solution.x > 0.5
+        free = lb < ub
+        support = np.flatnonzero(free & chosen)
+        rest = np.flatnonzero(free & ~chosen)
+
+        for j, i in enumerate(support):
+            child_lb = lb.copy()
+            child_ub = ub.copy()
+            child_lb[support[:j]] = 1
+            child_ub[i] = 0
+            count += 1
+            heapq.heappush(queue, (bound, count, child_lb, child_ub, covers, None))
+
+        if len(rest):
+            child_lb = lb.copy()
+            child_lb[support] = 1
+            count += 1
+            heapq.heappush(queue, (bound, count, child_lb, ub.copy(),
+                                   covers + [rest], None))
+
+    return solutions
+
+
+def cutAlternatives(model, k, distance = 1, backend = 'highs',
+                    time_limit = None, verbose = False):
+    """
+    K best menus by no-good cuts.
+    Input: binary matrix model, number of menus, minimum Hamming distance
+    between menus, solver backend, time limit per solve.
+    Output: list of Solutions, in the order found (best first).
+    """
+
+    backend = getBackend(backend)
+    solutions = []
+
+    if backend.name == 'gurobi':
+        # Cuts go into the live model, reoptimized from the previous search
+        t = time.time()
+        m, x = backend.build(model, verbose)
+        build_time = time.time() - t
+        if time_limit is not None:
+            m.Params.TimeLimit = time_limit
+
+        while len(solutions) < k:
+            t = time.time()
+            m.optimize()
+            solution = backend.solution(m, x, build_time, time.time() - t)
+            if solution.status not in (OPTIMAL, TIME_LIMIT) or solution.x is None:
+                break
+            solutions.append(solution)
+            row, rhs = noGoodCut(solution.x, distance)
+            m.addMConstr(sparse.csr_matrix(row.reshape(1, -1)), x, '>', [rhs])
+
+        return solutions
+
+    rows = []
+    bounds = []
+    current = model
+
+    while len(solutions) < k:
+        solution = backend.solve(current, time_limit = time_limit, verbose = verbose)
+        if solution.status not in (OPTIMAL, TIME_LIMIT) or solution.x is None:
+            break
+        solutions.append(solution)
+
+        row, rhs = noGoodCut(solution.x, distance)
+        rows.append(row)
+        bounds.append(rhs)
+
+        current = copy.copy(model)
+        current.A = sparse.vstack([model.A, sparse.csr_matrix(np.array(rows))], format = 'csr')
+        current.row_lower = np.concatenate([model.row_lower, bounds])
+        current.row_upper = np.concatenate([model.row_upper, np.full(len(rows), np.inf)])
+
+    return solutions
+
+
+def alternatives(model, k = 10, distance = 1, backend = 'highs',
+                 time_limit = None, verbose = False):
+    """
+    Returns the K best distinct menus ranked by objective.
+    Input: binary matrix model (mip, mip2, mip3), number of menus, minimum
+    Hamming distance between any two menus, solver backend, time limit per
+    solve. When distance is 1 Gurobi uses the solution pool and other
+    backends partitioning; larger distances use no-good cuts.
+    Output: list of (objective value, menu) pairs.
+    """
+
+    checkBinary(model)
+    backend = getBackend(backend)
+
+    if backend.name == 'gurobi' and distance <= 1:
+        solutions = poolAlternatives(model, k, time_limit, verbose)
+    elif distance <= 1:
+        solutions = partitionAlternatives(model, k, backend, time_limit, verbose)
+    else:
+        solutions = cutAlternatives(model, k, distance, backend, time_limit, verbose)
+
+    return [(solution.objVal, solution.selected(model.names))
+            for solution in ranked(solutions, model.sense)]
+
+
+def printAlternatives(menus):
+    """
+    Prints ranked alternative menus.
+    """
+
+    for i, (objVal, menu) in enumerate(menus):
+        print('\n%d. Objective: %g' % (i + 1, objVal))
+        for name in menu:
+            print('    ' + name)
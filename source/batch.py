@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Batch solving across many diner nutrition profiles. The recipee book and the
+base matrix model are built once and handed to every worker of a process
+pool; each profile only changes the nutrient row bounds (lp, mip, mip2) or
+the intake objective (mip3), so workers solve profiles concurrently without
+rebuilding anything.
+"""
+
+import copy
+import json
+import multiprocessing
+
+import numpy as np
+
+from Recipee import NUTRIENTS
+from model_builder import buildModel
+from solver import getBackend, INFINITY, INFEASIBLE
+from screening import reachableTotals, screen
+
+# Worker state, set once per process by initWorker
+WORKER = {}
+
+#******************************************************************************
+# HELPER FUNCTIONS
+#******************************************************************************
+
+def profileModel(base, book, formulation, profile):
+    """
+    Returns a copy of the base model for a profile. The constraint matrix is
+    shared, only bounds (or objective) are replaced.
+    """
+
+    model = copy.copy(base)
+
+    if formulation == 'mip3':
+        intake_names = [n for n in NUTRIENTS if n in profile.intake]
+        cols = [NUTRIENTS.index(n) for n in intake_names]
+        model.c = -book.varNutrients()[:, cols].sum(axis = 1)
+        model.offset = float(sum(profile.intake[n] for n in intake_names))
+        return model
+
+    model.row_lower = base.row_lower.copy()
+    model.row_upper = base.row_upper.copy()
+
+    for i, name in enumerate(base.row_names):
+        if name in NUTRIENTS:
+            model.row_lower[i], model.row_upper[i] = profile.bounds.get(
+                name, [-INFINITY, INFINITY])
+
+    return model
+
+
+def initWorker(book, base, formulation, backend, time_limit, screening):
+    """
+    Stores the shared book and base model in the worker process.
+    """
+
+    WORKER['book'] = book
+    WORKER['reachable'] = None
+    if screening and formulation in ('lp', 'mip', 'mip2'):
+        WORKER['reachable'] = reachableTotals(book, formulation)
+    WORKER['base'] = base
+    WORKER['formulation'] = formulation
+    WORKER['backend'] = getBackend(backend)
+    WORKER['time_limit'] = time_limit
+
+
+def solveProfile(profile):
+    """
+    Solves the model of one profile in a worker.
+    Output: (profile name, result dictionary).
+    """
+
+    book = WORKER['book']
+
+    # Bounds outside the reachable range are rejected without solving
+    if WORKER['reachable'] is not None:
+        report = screen(book, profile.bounds, WORKER['formulation'], False,
+                        reachable = WORKER['reachable'])
+        if report['feasible'] is False:
+            return profile.name, {'status': INFEASIBLE, 'objVal': None,
+                                  'menu': [], 'build_time': 0.0,
+                                  'solve_time': 0.0,
+                                  'screening': report['violations']}
+
+    model = profileModel(WORKER['base'], book, WORKER['formulation'], profile)
+    solution = WORKER['backend'].solve(model, time_limit = WORKER['time_limit'])
+
+    result = {'status': solution.status,
+              'objVal': solution.objVal,
+              'menu': solution.selected(model.names),
+              'build_time': solution.build_time,
+              'solve_time': solution.solve_time}
+
+    return profile.name, result
+
+#******************************************************************************
+# BATCH
+#******************************************************************************
+
+def solveProfiles(book, profiles, formulation = 'mip2', backend = 'highs',
+                  processes = None, time_limit = None, screening = True):
+    """
+    Solves one model per profile concurrently.
+    Input: recipee book, dictionary name -> Profile, formulation, solver
+    backend name, number of worker processes (default one per core, 1 solves
+    in this process), time limit per profile, whether profiles with
+    unreachable bounds are rejected before solving (mip, mip2).
+    Output: dictionary profile name -> result dictionary.
+    """
+
+    base = buildModel(book, formulation)
+    profiles = list(profiles.values())
+    args = (book, base, formulation, backend, time_limit, screening)
+
+    if processes == 1:
+        initWorker(*args)
+        return dict(solveProfile(profile) for profile in profiles)
+
+    pool = multiprocessing.Pool(processes, initWorker, args)
+    try:
+        results = dict(pool.imap_unordered(solveProfile, profiles))
+    finally:
+        pool.close()
+        pool.join()
+
+    # Keep the order of the profiles
+    return dict((profile.name, results[profile.name]) for profile in profiles)
+
+
+def writeResults(results, filename):
+    """
+    Writes batch results to a json file.
+    """
+
+    with open(filename, 'w') as output:
+        json.dump(results, output, indent = 2, default = float)
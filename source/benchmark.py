@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Scaling benchmark. A synthetic recipee book (recipee csv files in the kitchen
+system's format, food composition table and cost table) is generated at
+configurable sizes, and each stage is timed for every formulation: parse,
+nutrient compute, model build, export and solve (with --prune also the
+variable pruning of mip2 and mip3 and the pruned solve). Results are written
+as json for regression tracking.
+
+Usage: python benchmark.py --sizes 100 1000 10000 --output bench.json
+"""
+
+import os
+import csv
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+from Recipee import *
+from profiles import NUTRIENT_INTAKE
+from model_builder import Book, buildModel, FORMULATIONS, MEALS
+from nutrient_matrix import FoodMatrix, catalogNutrients
+from food_index import FoodIndex
+from recipee_stream import streamRecords
+from solver import getBackend
+from registry import writeMPS
+from pruning import pruneVariables
+
+# Subcategories per meal (b1..b5, l1..l5, d1..d4)
+SLOTS = [5, 5, 4]
+
+# Probability that a recipee belongs to breakfast, lunch, dinner
+MIX = [0.4, 0.5, 0.5]
+
+#******************************************************************************
+# SYNTHETIC RECIPEE BOOK
+#******************************************************************************
+
+def syntheticTables(path, foods, rng):
+    """
+    Writes a food composition table and a cost table with foods entries.
+    Nutrients per 100g are drawn around a fraction of the recommended intake.
+    Output: list of food names.
+    """
+
+    names = ['alimento %d' % i for i in range(foods)]
+
+    with open(os.path.join(path, FOOD_TABLE), 'w', encoding = ENCODING, newline = '') as table:
+        writer = csv.writer(table)
+        writer.writerow(['id', 'alimento'] + NUTRIENTS)
+        writer.writerow(['', ''] + ['' for n in NUTRIENTS])
+        for i, name in enumerate(names):
+            writer.writerow([i, name] + [round(rng.uniform(0, 0.25)*NUTRIENT_INTAKE.get(n, 10.0), 3)
+                                         for n in NUTRIENTS])
+
+    with open(os.path.join(path, COST_TABLE), 'w', encoding = ENCODING, newline = '') as table:
+        writer = csv.writer(table)
+        for name in names:
+            writer.writerow([name, round(rng.uniform(5, 150), 2), rng.choice([250, 500, 1000])])
+
+    return names
+
+
+def syntheticRecipee(filename, foods, ingredients, mix, rng):
+    """
+    Writes a recipee csv file with a random classification and ingredients.
+    """
+
+    classification = [rng.randint(1, SLOTS[i]) if rng.random() < mix[i] else 0
+                      for i in range(len(MEALS))]
+    if not any(classification):
+        i = rng.randrange(len(MEALS))
+        classification[i] = rng.randint(1, SLOTS[i])
+
+    servings = rng.randint(2, 8)
+    chosen = rng.sample(foods, min(len(foods), rng.randint(*ingredients)))
+    quantities = [rng.randint(10, 300) for food in chosen]
+
+    with open(filename, 'w', encoding = ENCODING, newline = '') as recipee:
+        writer = csv.writer(recipee)
+        writer.writerow(['Porciones', servings, '', '', ''])
+        writer.writerow(['Gramaje', float(sum(quantities)), '', '', ''])
+        writer.writerow(['Clasificacion'] + classification + [''])
+        writer.writerow(['Cantidad', 'Unidad', 'Gramos', 'Ingrediente', 'Instrucciones'])
+        for food, grams in zip(chosen, quantities):
+            writer.writerow([1, 'pza', grams, food, 'Mezclar.'])
+
+
+def generateCatalog(path, recipees, foods = 500, ingredients = (3, 12),
+                    mix = MIX, seed = 0):
+    """
+    Generates a synthetic recipee book.
+    Input: directory, number of recipees, number of foods, range of
+    ingredients per recipee, probability of each meal, random seed.
+    Output: recipee directory.
+    """
+
+    rng = random.Random(seed)
+    names = syntheticTables(path, foods, rng)
+    directory = os.path.join(path, RECETARIO)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    for r in range(recipees):
+        syntheticRecipee(os.path.join(directory, 'receta %06d.csv' % r),
+                         names, ingredients, mix, rng)
+
+    return directory
+
+#******************************************************************************
+# BENCHMARK
+#******************************************************************************
+
+def benchmarkCatalog(path, formulations = FORMULATIONS, backend = 'highs',
+                     time_limit = 60, prune = False):
+    """
+    Times every stage on a recipee book.
+    Input: directory, formulations, solver backend, time limit, whether to
+    also time pruneVariables and solve the pruned model (mip2, mip3).
+    Output: list of result dictionaries, one per formulation.
+    """
+
+    backend = getBackend(backend)
+    food_table = foodTable(os.path.join(path, FOOD_TABLE))
+    cost_table = FoodIndex(costTable(os.path.join(path, COST_TABLE)))
+    food_matrix = FoodMatrix(food_table)
+
+    t = time.time()
+    recipees = [Recipee(record, food_matrix, cost_table, False)
+                for record in streamRecords(os.path.join(path, RECETARIO))]
+    parse_time = time.time() - t
+
+    t = time.time()
+    nutrients = catalogNutrients(recipees, food_matrix)
+    nutrient_time = time.time() - t
+
+    results = []
+
+    for formulation in formulations:
+        t = time.time()
+        book = Book(recipees, nutrients)
+        model = buildModel(book, formulation)
+        build_time = time.time() - t
+
+        t = time.time()
+        writeMPS(model, os.path.join(path, 'benchmark.mps.gz'))
+        export_time = time.time() - t
+
+        solution = backend.solve(model, time_limit = time_limit)
+
+        pruning = {}
+        if prune and formulation in ('mip2', 'mip3'):
+            t = time.time()
+            columns, report = pruneVariables(book, formulation)
+            pruned = buildModel(book, formulation, columns = columns)
+            pruning['prune'] = time.time() - t
+            pruning['pruned_vars'] = pruned.numVars()
+            pruned_solution = backend.solve(pruned, time_limit = time_limit)
+            pruning['pruned_status'] = pruned_solution.status
+            pruning['pruned_objVal'] = pruned_solution.objVal
+            pruning['pruned_solve'] = pruned_solution.build_time + pruned_solution.solve_time
+
+        results.append(dict(pruning, **{'recipees': len(recipees),
+                        'foods': len(food_table),
+                        'formulation': formulation,
+                        'backend': backend.name,
+                        'vars': model.numVars(),
+                        'constrs': model.numConstrs(),
+                        'nonzeros': int(model.A.nnz),
+                        'status': solution.status,
+                        'objVal': solution.objVal,
+                        'parse': parse_time,
+                        'nutrients': nutrient_time,
+                        'build': build_time,
+                        'export': export_time,
+                        'solve': solution.build_time + solution.solve_time}))
+
+    return results
+
+
+def benchmark(sizes = (100, 1000, 10000), foods = 500, ingredients = (3, 12),
+              mix = MIX, formulations = FORMULATIONS, backend = 'highs',
+              time_limit = 60, output = None, seed = 0, prune = False):
+    """
+    Generates a synthetic book of every size and benchmarks it.
+    Output: list of result dictionaries, also written to output (json).
+    """
+
+    results = []
+
+    for size in sizes:
+        path = tempfile.mkdtemp(prefix = 'menu_benchmark_')
+        try:
+            generateCatalog(path, size, foods, ingredients, mix, seed)
+            rows = benchmarkCatalog(path, formulations, backend, time_limit, prune)
+        finally:
+            shutil.rmtree(path)
+        for result in rows:
+            print("%(recipees)7d %(formulation)5s %(status)10s  parse %(parse).3fs"
+                  "  nutrients %(nutrients).3fs  build %(build).3fs"
+                  "  solve %(solve).3fs" % result)
+            if 'pruned_vars' in result:
+                print("%7s %5s %10s  vars %d -> %d  prune %.3fs  solve %.3fs  obj %s -> %s"
+                      % ('', '', result['pruned_status'], result['vars'],
+                         result['pruned_vars'], result['prune'],
+                         result['pruned_solve'], result['objVal'],
+                         result['pruned_objVal']))
+            results.append(result)
+
+    if output is not None:
+        with open(output, 'w') as data:
+            json.dump(results, data, indent = 2)
+
+    return results
+
+
+def main(argv = None):
+    """
+    Command line entry point.
+    """
+
+    parser = argparse.ArgumentParser(description = 'Menu planning scaling benchmark')
+    parser.add_argument('--sizes', type = int, nargs = '+', default = [100, 1000, 10000])
+    parser.add_argument('--foods', type = int, default = 500)
+    parser.add_argument('--ingredients', type = int, nargs = 2, default = [3, 12])
+    parser.add_argument('--mix', type = float, nargs = 3, default = MIX)
+    parser.add_argument('--formulations', nargs = '+', default = FORMULATIONS)
+    parser.add_argument('--backend', default = 'highs')
+    parser.add_argument('--time-limit', type = float, default = 60)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--output', default = None,
+                        help = 'json file for the results (default: print only)')
+    parser.add_argument('--prune', action = 'store_true',
+                        help = 'also time pruning and the pruned model (mip2, mip3)')
+    args = parser.parse_args(argv)
+
+    benchmark(args.sizes, args.foods, tuple(args.ingredients), args.mix,
+              args.formulations, args.backend, args.time_limit, args.output,
+              args.seed, args.prune)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Incremental compiled recipee catalog. The parsed recipees, their nutrients and
+costs are stored in a npz file together with the content hashes of every
+recipee file, the food table and the cost table they were built from, and
+the settings of the ingredient name resolver. A rebuild only parses the
+recipees whose file changed, and only recomputes nutrients (costs) when the
+food (cost) table or the resolver changed.
+"""
+
+import os
+import glob
+import hashlib
+
+import numpy as np
+
+from Recipee import *
+from nutrient_matrix import FoodMatrix, catalogNutrients
+from food_index import FoodIndex, resolverKey
+
+VERSION = 2
+
+#******************************************************************************
+# HELPER FUNCTIONS
+#******************************************************************************
+
+def fileHash(filename):
+    """
+    Returns the sha1 hex digest of a file's content.
+    """
+
+    digest = hashlib.sha1()
+
+    with open(filename, 'rb') as data:
+        for block in iter(lambda: data.read(1 << 16), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def loadCatalog(filename):
+    """
+    Reads a compiled catalog.
+    Output: dictionary with keys food_hash, cost_hash, resolver and entries, a
+    dictionary file -> (hash, record, nutrients row, cost); None if the file
+    does not exist or was written by another version.
+    """
+
+    if not os.path.exists(filename):
+        return None
+
+    with np.load(filename) as data:
+        if int(data['version']) != VERSION:
+            return None
+
+        files = data['files'].tolist()
+        hashes = data['hashes'].tolist()
+        names = data['names'].tolist()
+        servings = data['servings'].tolist()
+        grams = data['grams'].tolist()
+        class_offsets = data['class_offsets'].tolist()
+        classes = data['classes'].tolist()
+        ing_offsets = data['ing_offsets'].tolist()
+        ing_names = data['ing_names'].tolist()
+        ing_grams = data['ing_grams'].tolist()
+        nutrients = data['nutrients']
+        costs = data['costs'].tolist()
+        food_hash = str(data['food_hash'])
+        cost_hash = str(data['cost_hash'])
+        resolver = str(data['resolver'])
+
+    entries = {}
+
+    for i, filename in enumerate(files):
+        a, b = ing_offsets[i], ing_offsets[i + 1]
+        ingredients = [['', '', g, name]
+                       for g, name in zip(ing_grams[a:b], ing_names[a:b])]
+        record = (names[i], servings[i], grams[i],
+                  classes[class_offsets[i]:class_offsets[i + 1]], ingredients)
+        entries[filename] = (hashes[i], record, nutrients[i], costs[i])
+
+    return {'food_hash': food_hash, 'cost_hash': cost_hash, 'resolver': resolver,
+            'entries': entries}
+
+
+def saveCatalog(filename, files, hashes, recipees, nutrients, food_hash,
+                cost_hash, resolver = None):
+    """
+    Writes a compiled catalog. The file is replaced atomically.
+    """
+
+    if resolver is None:
+        resolver = resolverKey()
+
+    class_offsets = [0]
+    classes = []
+    ing_offsets = [0]
+    ing_names = []
+    ing_grams = []
+
+    for recipee in recipees:
+        classes.extend(recipee.classification)
+        class_offsets.append(len(classes))
+        ing_names.extend(recipee.foods)
+        ing_grams.extend(recipee.quantities.tolist())
+        ing_offsets.append(len(ing_names))
+
+    temp = filename + '.tmp'
+
+    with open(temp, 'wb') as data:
+        np.savez(data,
+                 version = np.array(VERSION),
+                 files = np.array(files, dtype = str),
+                 hashes = np.array(hashes, dtype = str),
+                 names = np.array([r.name for r in recipees], dtype = str),
+                 servings = np.array([r.servings for r in recipees], dtype = int),
+                 grams = np.array([r.grams for r in recipees], dtype = float),
+                 class_offsets = np.array(class_offsets, dtype = int),
+                 classes = np.array(classes, dtype = int),
+                 ing_offsets = np.array(ing_offsets, dtype = int),
+                 ing_names = np.array(ing_names, dtype = str),
+                 ing_grams = np.array(ing_grams, dtype = float),
+                 nutrients = np.asarray(nutrients, dtype = float).reshape(-1, len(NUTRIENTS)),
+                 costs = np.array([r.cost for r in recipees], dtype = float),
+                 food_hash = np.array(food_hash),
+                 cost_hash = np.array(cost_hash),
+                 resolver = np.array(resolver))
+
+    os.replace(temp, filename)
+
+#******************************************************************************
+# BUILDER
+#******************************************************************************
+
+def compiledBuilder(path, cache_file, recetario = RECETARIO):
+    """
+    Builds a list of recipees, reusing a compiled catalog.
+    Input: directory with the food tables and the recipee directory,
+    compiled catalog file, recipee directory name.
+    Output: recipees, food table, cost table (as recipeeBuilder).
+    """
+
+    food_file = os.path.join(path, FOOD_TABLE)
+    cost_file = os.path.join(path, COST_TABLE)
+    food_table = foodTable(food_file)
+    cost_table = costTable(cost_file)
+    food_hash = fileHash(food_file)
+    cost_hash = fileHash(cost_file)
+
+    filenames = sorted(glob.glob(os.path.join(path, recetario, '*.csv')))
+    files = [os.path.basename(f) for f in filenames]
+    hashes = [fileHash(f) for f in filenames]
+
+    cached = loadCatalog(cache_file)
+    entries = {}
+    same_food = same_cost = False
+    if cached is not None:
+        entries = cached['entries']
+        # Nutrients and costs depend on how ingredient names resolve
+        same_resolver = cached['resolver'] == resolverKey()
+        same_food = same_resolver and cached['food_hash'] == food_hash
+        same_cost = same_resolver and cached['cost_hash'] == cost_hash
+
+    recipees = []
+    nutrients = np.zeros((len(files), len(NUTRIENTS)))
+    stale_nutrients = []
+    stale_cost = []
+
+    for i, (filename, digest) in enumerate(zip(files, hashes)):
+        entry = entries.get(filename)
+
+        if entry is not None and entry[0] == digest:
+            recipee = Recipee(entry[1], food_table, cost_table, False, False)
+            if same_food:
+                nutrients[i] = entry[2]
+                recipee.nutrients = nutrients[i]
+            else:
+                stale_nutrients.append(i)
+            if same_cost:
+                recipee.cost = entry[3]
+            else:
+                stale_cost.append(i)
+        else:
+            recipee = Recipee(filenames[i], food_table, cost_table, False, False)
+            stale_nutrients.append(i)
+            stale_cost.append(i)
+
+        recipees.append(recipee)
+
+    if stale_nutrients:
+        nutrients[stale_nutrients] = catalogNutrients(
+            [recipees[i] for i in stale_nutrients], FoodMatrix(food_table))
+        for i in stale_nutrients:
+            recipees[i].nutrients = nutrients[i]
+
+    if stale_cost:
+        cost_index = FoodIndex(cost_table)
+        for i in stale_cost:
+            recipees[i].cost = recipees[i].recipeeCost(cost_index)
+
+    if stale_nutrients or stale_cost or len(entries) != len(files):
+        saveCatalog(cache_file, files, hashes, recipees, nutrients,
+                    food_hash, cost_hash)
+
+    return recipees, food_table, cost_table
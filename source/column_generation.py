@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Column generation for large recipee catalogs (mip, mip2, mip3). Instead of
+one binary per recipee-slot pair up front, a restricted master starts with a
+few recipee-slots per category. Every round its LP relaxation is solved and
+all recipee-slots of the catalog are priced at once from the row duals y:
+
+    reduced cost[j] = c[j] - nutrients[recipee[j]].y_nutrients - y_category[slot[j]]
+
+and only the most negative ones enter the master. Bounds the initial columns
+cannot meet are handled by a phase one over elastic nutrient rows, which also
+proves infeasibility of the whole catalog. When no column prices out, the
+master LP value is a lower bound for the full model and the final integer
+solve runs over the generated columns only. Its menu is feasible for the full
+model; columns whose reduced cost is below the gap to the bound are then
+added and the integer solve repeated, which makes the menu optimal.
+"""
+
+import time
+
+import numpy as np
+from scipy import sparse
+
+from Recipee import NUTRIENTS
+from profiles import NUTRITION_BOUNDS, NUTRIENT_INTAKE
+from model_builder import CATEGORIES, buildModel
+from solver import getBackend, Solution, OPTIMAL, INFEASIBLE, ERROR
+
+#******************************************************************************
+# HELPER FUNCTIONS
+#******************************************************************************
+
+def initialColumns(book, c, initial = 5):
+    """
+    Returns the variables of the first restricted master: the initial
+    cheapest recipee-slots of every category.
+    Input: recipee book, objective of every variable, columns per category.
+    """
+
+    order = np.lexsort((c, book.slot))
+    slots = book.slot[order]
+    rank = np.arange(len(order)) - np.searchsorted(slots, slots)
+    return np.sort(order[rank < initial])
+
+
+def masterLP(model, c, elastic = 0, bounded = True):
+    """
+    Solves the LP relaxation of a restricted master with HiGHS.
+    Input: matrix model, objective vector, number of leading (nutrient) rows
+    that get elastic columns (phase one: cover the row bounds at cost one per
+    unit outside them), whether to keep the variable upper bounds (with
+    category rows x <= 1 is implied, and dropping it keeps the duals on the
+    rows).
+    Output: scipy result (x includes the elastic columns last), row duals.
+    """
+
+    from scipy.optimize import linprog
+
+    A = model.A
+    lb = model.lb
+    ub = model.ub if bounded else np.full(model.numVars(), np.inf)
+    if elastic:
+        E = sparse.eye(A.shape[0], elastic, format = 'csr')
+        A = sparse.hstack([A, E, -E], format = 'csr')
+        c = np.concatenate([c, np.ones(2*elastic)])
+        lb = np.concatenate([lb, np.zeros(2*elastic)])
+        ub = np.concatenate([ub, np.full(2*elastic, np.inf)])
+
+    # row_lower <= A.x <= row_upper as A.x <= row_upper and -A.x <= -row_lower
+    upper = np.isfinite(model.row_upper)
+    lower = np.isfinite(model.row_lower)
+    A_ub = sparse.vstack([A[upper], -A[lower]], format = 'csr')
+    b_ub = np.concatenate([model.row_upper[upper], -model.row_lower[lower]])
+
+    result = linprog(c, A_ub = A_ub, b_ub = b_ub,
+                     bounds = np.column_stack([lb, ub]), method = 'highs')
+
+    y = np.zeros(model.numConstrs())
+    if result.status == 0:
+        marginals = result.ineqlin.marginals
+        y[upper] += marginals[:upper.sum()]
+        y[lower] -= marginals[upper.sum():]
+
+    return result, y
+
+#******************************************************************************
+# COLUMN GENERATION
+#******************************************************************************
+
+def columnGeneration(book, formulation = 'mip2', bounds = NUTRITION_BOUNDS,
+                     intake = NUTRIENT_INTAKE, initial = 5, batch = 200,
+                     max_rounds = 500, tolerance = 1e-7, backend = 'highs',
+                     time_limit = None, complete = 200, verbose = False):
+    """
+    Solves a formulation by column generation.
+    Input: recipee book, formulation (mip, mip2, mip3), nutrient bounds (mip,
+    mip2), recommended nutrient intake (mip3), recipee-slots per category in
+    the first master, maximum columns added per round, maximum rounds,
+    reduced cost tolerance, backend and time limit of the final integer
+    solve, maximum columns within the gap added for a second integer solve
+    (0 to skip; when every such column fits the menu is proven optimal for
+    the full catalog).
+    Output: (restricted matrix model, Solution over its columns, dictionary
+    with columns (variable ids of the model), selected (variable ids in the
+    menu), lp bound, gap, proven (optimal for the full catalog), rounds and
+    history of every round).
+    """
+
+    if formulation not in ('mip', 'mip2', 'mip3'):
+        raise ValueError("Column generation supports mip, mip2 and mip3, not %s" % formulation)
+
+    t = time.time()
+
+    # Objective and priced nutrient rows, at recipee level
+    if formulation == 'mip3':
+        intake_cols = [NUTRIENTS.index(n) for n in NUTRIENTS if n in intake]
+        objective = -book.nutrients[:, intake_cols].sum(axis = 1)
+        nutrient_cols = []
+    else:
+        objective = book.cost
+        nutrient_cols = [NUTRIENTS.index(n) for n in NUTRIENTS if n in bounds]
+    nutrients = book.nutrients[:, nutrient_cols]
+    k = len(nutrient_cols)
+
+    columns = initialColumns(book, objective[book.recipee], initial)
+    in_master = np.zeros(book.numVars(), dtype = bool)
+    in_master[columns] = True
+
+    phase = 1 if k else 2
+    converged = False
+    history = []
+    report = {'columns': columns, 'selected': np.array([], dtype = int),
+              'lp': None, 'gap': None, 'proven': False, 'rounds': 0,
+              'history': history}
+
+    for rounds in range(1, max_rounds + 1):
+        model = buildModel(book, formulation, bounds, intake, columns)
+        c = np.zeros(len(columns)) if phase == 1 else model.c
+        result, y = masterLP(model, c, k if phase == 1 else 0,
+                             bounded = formulation == 'mip')
+
+        if result.status != 0:
+            report['rounds'] = rounds
+            return model, Solution(ERROR, backend = 'highs'), report
+
+        lp = result.fun if phase == 1 else result.fun + model.offset
+        row = {'round': rounds, 'phase': phase, 'columns': len(columns), 'lp': lp,
+               'added': 0}
+        history.append(row)
+
+        if phase == 1 and result.fun <= 1e-6:
+            # Master covers every nutrient bound, price the real objective
+            phase = 2
+            if verbose:
+                print('Round %d: phase one done, %d columns' % (rounds, len(columns)))
+            continue
+
+        # Price every recipee-slot of the catalog
+        y_category = np.zeros(len(CATEGORIES))
+        if formulation != 'mip':
+            y_category = y[k:]
+        price = -nutrients.dot(y[:k])
+        if phase == 2:
+            price += objective
+        reduced = price[book.recipee] - y_category[book.slot]
+        reduced[in_master] = np.inf
+
+        new = np.flatnonzero(reduced < -tolerance)
+        if len(new) > batch:
+            new = new[np.argpartition(reduced[new], batch)[:batch]]
+        row['added'] = len(new)
+
+        if verbose:
+            print('Round %d: phase %d, %d columns, lp %g, %d added' % (
+                rounds, phase, len(columns), lp, len(new)))
+
+        if len(new) == 0:
+            converged = True
+            break
+
+        in_master[new] = True
+        columns = np.flatnonzero(in_master)
+
+    report['rounds'] = rounds
+    report['columns'] = columns
+
+    if not converged:
+        # Round limit reached: the master LP is not a bound yet
+        if phase == 1:
+            return model, Solution(ERROR, backend = 'highs'), report
+    elif phase == 1:
+        # No column reduces the bound violations: the LP relaxation of the
+        # full catalog is infeasible
+        solution = Solution(INFEASIBLE, build_time = time.time() - t,
+                            backend = 'highs')
+        return model, solution, report
+    else:
+        report['lp'] = lp
+
+    build_time = time.time() - t
+
+    model = buildModel(book, formulation, bounds, intake, columns)
+    solution = getBackend(backend).solve(model, time_limit = time_limit,
+                                         verbose = verbose)
+
+    if converged and solution.status == OPTIMAL:
+        # A menu using recipee-slot j costs at least lp + reduced[j]; adding
+        # every column below the gap makes the restricted optimum optimal
+        extra = np.flatnonzero(reduced < solution.objVal - lp - tolerance)
+        every = len(extra) <= complete
+        report['proven'] = len(extra) == 0
+        if len(extra) > complete:
+            extra = extra[np.argpartition(reduced[extra], complete)[:complete]]
+        if len(extra):
+            in_master[extra] = True
+            columns = np.flatnonzero(in_master)
+            report['columns'] = columns
+            history.append({'round': rounds + 1, 'phase': 3, 'columns': len(columns),
+                            'lp': lp, 'added': len(extra)})
+            build_time += solution.build_time + solution.solve_time
+            model = buildModel(book, formulation, bounds, intake, columns)
+            solution = getBackend(backend).solve(model, time_limit = time_limit,
+                                                 verbose = verbose)
+            # Proven only if the repeated solve finished with every column
+            report['proven'] = every and solution.status == OPTIMAL
+
+    solution.build_time += build_time
+
+    if solution.x is not None:
+        report['selected'] = columns[solution.x > 0.5]
+        if solution.status == OPTIMAL and report['lp'] is not None:
+            report['gap'] = max(solution.objVal - lp, 0.0)/max(abs(solution.objVal), 1e-9)
+
+    return model, solution, report
+
+
+def printColumnGeneration(report):
+    """
+    Prints the rounds of a column generation run.
+    """
+
+    for row in report['history']:
+        print('Round %(round)d: phase %(phase)d, %(columns)d columns, '
+              'lp %(lp)g, %(added)d added' % row)
+    if report['lp'] is not None:
+        print('\nLP bound: %g' % report['lp'])
+    if report['gap'] is not None:
+        print('Gap to the bound: %.4f%%%s' % (100*report['gap'],
+                                              ' (proven optimal)' if report['proven']
+                                              else ''))
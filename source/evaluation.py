@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Batch evaluation of menus. Candidate menus (hand-built or solver-built) are
+a sparse menus x recipees matrix M, so every nutrient total and cost is one
+product
+
+    totals = M.nutrients,  cost = M.cost
+
+and the bound violations of every menu against one or several profiles are
+array comparisons on the totals, without a Python loop per menu.
+"""
+
+import numpy as np
+from scipy import sparse
+
+from Recipee import NUTRIENTS
+from profiles import NUTRITION_BOUNDS, INFINITY
+
+#******************************************************************************
+# HELPER FUNCTIONS
+#******************************************************************************
+
+def menuMatrix(book, menus):
+    """
+    Returns the menus x recipees matrix of a list of menus.
+    Input: recipee book, menus as a (sparse or dense) menus x recipees or
+    menus x variables matrix, or a list of menus, each a list of recipee
+    names, recipee-slot names or variable indices, or a vector of variable
+    values (e.g. Solution.x) or boolean mask, one per variable.
+    Output: csr matrix, one row per menu, one column per recipee.
+    """
+
+    r = len(book.recipees)
+    n = book.numVars()
+
+    # Recipee-slot variables map to their recipee
+    variables = sparse.csr_matrix((np.ones(n), (np.arange(n), book.recipee)),
+                                  shape = (n, r))
+
+    if sparse.issparse(menus) or (isinstance(menus, np.ndarray) and menus.ndim == 2):
+        matrix = sparse.csr_matrix(menus, dtype = float)
+        if matrix.shape[1] == r:
+            return matrix
+        if matrix.shape[1] == n:
+            return matrix.dot(variables).tocsr()
+        raise ValueError("Menu matrix has %d columns, expected %d recipees or %d variables"
+                         % (matrix.shape[1], r, n))
+
+    recipee_index = None
+    var_index = None
+    rows = []
+    cols = []
+    values = []
+
+    for m, menu in enumerate(menus):
+        if isinstance(menu, np.ndarray) and menu.dtype.kind in 'bf':
+            menu = menu.astype(float)
+            if len(menu) != n:
+                raise ValueError("Menu vector has %d values, expected %d variables"
+                                 % (len(menu), n))
+            selected = np.flatnonzero(menu > 0.0001)
+            rows.extend([m]*len(selected))
+            cols.extend(book.recipee[selected].tolist())
+            values.extend(menu[selected].tolist())
+            continue
+        for item in menu:
+            if isinstance(item, str):
+                if recipee_index is None:
+                    recipee_index = dict((name, i) for i, name in enumerate(book.recipees))
+                    var_index = dict((name, i) for i, name in enumerate(book.names))
+                if item in recipee_index:
+                    col = recipee_index[item]
+                elif item in var_index:
+                    col = book.recipee[var_index[item]]
+                else:
+                    raise KeyError("Unknown recipee %s" % item)
+            else:
+                col = book.recipee[int(item)]
+            rows.append(m)
+            cols.append(int(col))
+            values.append(1.0)
+
+    return sparse.csr_matrix((values, (rows, cols)), shape = (len(menus), r))
+
+
+def menuTotals(book, menus):
+    """
+    Returns the nutrient totals (menus x nutrients) and the cost of every
+    menu (see menuMatrix).
+    """
+
+    matrix = menuMatrix(book, menus)
+    totals = np.asarray(matrix.dot(book.nutrients)).reshape(-1, len(NUTRIENTS))
+    cost = np.asarray(matrix.dot(book.cost)).ravel()
+    return totals, cost
+
+
+def boundVectors(bounds):
+    """
+    Returns lower and upper bound vectors following NUTRIENTS. Nutrients
+    without bounds are unbounded.
+    """
+
+    lower = np.array([bounds[n][0] if n in bounds else -INFINITY for n in NUTRIENTS],
+                     dtype = float)
+    upper = np.array([bounds[n][1] if n in bounds else INFINITY for n in NUTRIENTS],
+                     dtype = float)
+    return lower, upper
+
+
+def intakeVector(intake):
+    """
+    Returns the recommended intake vector following NUTRIENTS (nan for
+    nutrients outside the intake objective).
+    """
+    return np.array([intake.get(n, np.nan) for n in NUTRIENTS], dtype = float)
+
+#******************************************************************************
+# MENU SCORING
+#******************************************************************************
+
+def scoreMenus(book, menus, bounds = NUTRITION_BOUNDS, intake = None,
+               tolerance = 1e-9):
+    """
+    Scores a batch of menus.
+    Input: recipee book, menus (see menuMatrix), nutrient bounds, recommended
+    nutrient intake (optional), tolerance on the bounds.
+    Output: dictionary with totals (menus x nutrients), cost, below and above
+    (menus x nutrients, amount outside the bounds), violations (number of
+    bounds violated per menu), feasible and, with an intake, deviation (the
+    mip3 objective, sum over n of intake[n] - total[n]).
+    """
+
+    totals, cost = menuTotals(book, menus)
+
+    return scoreTotals(totals, cost, bounds, intake, tolerance)
+
+
+def scoreTotals(totals, cost, bounds = NUTRITION_BOUNDS, intake = None,
+                tolerance = 1e-9):
+    """
+    Scores precomputed nutrient totals (see scoreMenus).
+    """
+
+    lower, upper = boundVectors(bounds)
+    below = np.maximum(lower - totals, 0)
+    above = np.maximum(totals - upper, 0)
+    violations = ((below > tolerance) | (above > tolerance)).sum(axis = 1)
+
+    scores = {'totals': totals, 'cost': cost, 'below': below, 'above': above,
+              'violations': violations, 'feasible': violations == 0}
+
+    if intake is not None:
+        target = intakeVector(intake)
+        keep = ~np.isnan(target)
+        scores['deviation'] = target[keep].sum() - totals[:, keep].sum(axis = 1)
+
+    return scores
+
+
+def scoreProfiles(book, menus, profiles, tolerance = 1e-9):
+    """
+    Scores a batch of menus against every profile. Totals and costs are
+    computed once and the bounds of all profiles are compared in one pass.
+    Input: recipee book, menus (see menuMatrix), dictionary name -> Profile
+    (or list of Profiles), tolerance on the bounds.
+    Output: dictionary with totals, cost, profiles (names), below and above
+    (profiles x menus x nutrients), violations and feasible (profiles x
+    menus) and deviation (profiles x menus, mip3 objective).
+    """
+
+    if isinstance(profiles, dict):
+        profiles = list(profiles.values())
+
+    totals, cost = menuTotals(book, menus)
+
+    limits = np.array([boundVectors(profile.bounds) for profile in profiles]).reshape(
+        -1, 2, 1, len(NUTRIENTS))
+    lower = limits[:, 0]
+    upper = limits[:, 1]
+
+    below = np.maximum(lower - totals, 0)
+    above = np.maximum(totals - upper, 0)
+    violations = ((below > tolerance) | (above > tolerance)).sum(axis = 2)
+
+    target = np.array([intakeVector(profile.intake) for profile in profiles]).reshape(
+        -1, len(NUTRIENTS))
+    keep = ~np.isnan(target)
+    deviation = np.where(keep, target, 0).sum(axis = 1)[:, None] - totals.dot(keep.T).T
+
+    return {'totals': totals, 'cost': cost,
+            'profiles': [profile.name for profile in profiles],
+            'below': below, 'above': above, 'violations': violations,
+            'feasible': violations == 0, 'deviation': deviation}
+
+
+def menuViolations(scores, menu, tolerance = 1e-9):
+    """
+    Returns the violated bounds of one menu of a scoreMenus result.
+    Output: list of dictionaries with nutrient, bound (min or max), total and
+    gap.
+    """
+
+    violations = []
+
+    for i in np.flatnonzero(scores['below'][menu] > tolerance):
+        violations.append({'nutrient': NUTRIENTS[i], 'bound': 'min',
+                           'total': float(scores['totals'][menu, i]),
+                           'gap': float(scores['below'][menu, i])})
+    for i in np.flatnonzero(scores['above'][menu] > tolerance):
+        violations.append({'nutrient': NUTRIENTS[i], 'bound': 'max',
+                           'total': float(scores['totals'][menu, i]),
+                           'gap': float(scores['above'][menu, i])})
+
+    return violations
+
+
+def printScores(scores, labels = None):
+    """
+    Prints cost and violated bounds of every menu of a scoreMenus result.
+    """
+
+    for m in range(len(scores['cost'])):
+        label = labels[m] if labels is not None else 'Menu %d' % m
+        print('\n%s: $%.2f, %d bound(s) violated' % (label, scores['cost'][m],
+                                                     scores['violations'][m]))
+        for row in menuViolations(scores, m):
+            print('%(nutrient)s %(bound)s: total %(total)g, gap %(gap)g' % row)
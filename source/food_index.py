@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Normalized ingredient-name index for the food and cost tables. Recipee files
+use decorated names (cebolla*, accents, capitals); the index maps names
+stripped of markers, accents and case to table entries. Near-misses are not
+substituted by default (leche entera is not leche descremada): the trigram
+index only suggests candidates for the report, unless fuzzy matching is
+asked for, and then every substitution is warned about. Lookups are memoized
+and every unresolved ingredient is recorded for a report.
+"""
+
+import re
+import warnings
+import unicodedata
+
+import numpy as np
+
+# Characters used as markers in recipee files
+MARKERS = '*'
+
+# Minimum Dice similarity of trigram sets for a fuzzy match
+THRESHOLD = 0.7
+
+# Version of normalize and trigrams; bump when name resolution changes
+NORMALIZATION = 1
+
+#******************************************************************************
+# HELPER FUNCTIONS
+#******************************************************************************
+
+def normalize(name):
+    """
+    Returns an ingredient name without markers, accents, case and repeated
+    blanks.
+    """
+
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    name = name.lower().strip(MARKERS + ' ')
+    for marker in MARKERS:
+        name = name.replace(marker, ' ')
+    return re.sub(r'\s+', ' ', name).strip()
+
+
+def resolverKey(fuzzy = False, threshold = THRESHOLD):
+    """
+    Returns a string identifying how names resolve (normalization version,
+    markers, fuzzy matching and its threshold), for keying data computed
+    through the index.
+    """
+    return 'normalization %d, markers %r, fuzzy %r, threshold %r' % (
+        NORMALIZATION, MARKERS, fuzzy, threshold if fuzzy else None)
+
+
+def trigrams(name):
+    """
+    Returns the set of character trigrams of a normalized name.
+    """
+
+    padded = '  ' + name + ' '
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+#******************************************************************************
+# FOOD INDEX
+#******************************************************************************
+
+class FoodIndex:
+    """
+    Read-only dictionary view of a food or cost table with tolerant keys.
+    """
+
+    def __init__(self, table, threshold = THRESHOLD, fuzzy = False):
+        """
+        Initialize the index.
+        Input: table (dictionary food -> values), fuzzy match threshold,
+        whether near-misses at or above the threshold are substituted (each
+        one with a warning) instead of left unresolved.
+        """
+
+        self.table = table
+        self.threshold = threshold
+        self.fuzzy_match = fuzzy
+        self.keys = list(table.keys())
+        self.exact = {}
+        self.postings = {}
+        self.sizes = []
+
+        for i, key in enumerate(self.keys):
+            name = normalize(key)
+            self.exact.setdefault(name, key)
+            grams = trigrams(name)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(i)
+
+        # Posting lists as arrays, shared trigrams are counted with bincount
+        for gram in self.postings:
+            self.postings[gram] = np.array(self.postings[gram], dtype = np.int32)
+        self.sizes = np.array(self.sizes, dtype = float)
+
+        self.memo = {}
+        self.fuzzy = {}        # ingredient -> (food, score)
+        self.unresolved = {}   # ingredient -> number of lookups
+
+
+    def __len__(self):
+        """
+        Number of foods.
+        """
+        return len(self.table)
+
+
+    def __contains__(self, name):
+        """
+        True if the name resolves to a food.
+        """
+        return self.resolve(name) is not None
+
+
+    def __getitem__(self, name):
+        """
+        Returns the table values of the food a name resolves to.
+        """
+
+        key = self.resolve(name)
+        if key is None:
+            raise KeyError(name)
+        return self.table[key]
+
+
+    def get(self, name, default = None):
+        """
+        Returns the table values of the food a name resolves to, or default.
+        """
+
+        key = self.resolve(name)
+        if key is None:
+            return default
+        return self.table[key]
+
+
+    def candidates(self, name, k = 3):
+        """
+        Returns the k most similar foods as a list of (food, score).
+        Score is the Dice similarity of the trigram sets.
+        """
+
+        grams = trigrams(normalize(name))
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not lists:
+            return []
+
+        shared = np.bincount(np.concatenate(lists), minlength = len(self.keys))
+        scores = 2.0*shared/(len(grams) + self.sizes)
+        k = min(k, len(self.keys))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = sorted(best.tolist(), key = lambda i: (-scores[i], self.keys[i]))
+
+        return [(self.keys[i], float(scores[i])) for i in best if shared[i] > 0]
+
+
+    def resolve(self, name):
+        """
+        Returns the table key a name resolves to, or None.
+        Exact keys and normalized names are O(1); near-misses are matched
+        through the trigram index only with fuzzy matching on. Results are
+        memoized.
+        """
+
+        if name in self.table:
+            return name
+        if name in self.memo:
+            key = self.memo[name]
+            if key is None:
+                self.unresolved[name] += 1
+            return key
+
+        key = self.exact.get(normalize(name))
+
+        if key is None:
+            best = self.candidates(name, 1) if self.fuzzy_match else []
+            if best and best[0][1] >= self.threshold:
+                key = best[0][0]
+                self.fuzzy[name] = best[0]
+                warnings.warn("Ingredient %s resolved to %s (similarity %.2f)"
+                              % (name, key, best[0][1]), stacklevel = 2)
+            else:
+                self.unresolved[name] = 1
+
+        self.memo[name] = key
+        return key
+
+
+    def report(self, k = 3):
+        """
+        Returns a dictionary with the fuzzy matches (ingredient -> (food,
+        score)) and the unresolved ingredients (ingredient -> number of
+        lookups and the k best candidates, as suggestions).
+        """
+
+        unresolved = dict((name, {'lookups': count,
+                                  'candidates': self.candidates(name, k)})
+                          for name, count in self.unresolved.items())
+
+        return {'fuzzy': dict(self.fuzzy), 'unresolved': unresolved}
+
+
+def unresolvedReport(recipees, index, k = 3):
+    """
+    Returns, for each ingredient of a list of recipees that the index cannot
+    resolve, the recipees using it and the k best candidates.
+    """
+
+    report = {}
+
+    for recipee in recipees:
+        for ingredient in recipee.ingredients:
+            if index.resolve(ingredient) is None:
+                if ingredient not in report:
+                    report[ingredient] = {'recipees': [],
+                                          'candidates': index.candidates(ingredient, k)}
+                report[ingredient]['recipees'].append(recipee.name)
+
+    return report
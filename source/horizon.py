@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Multi-day horizon planner. Each day has the category structure of mip2 (at
+most one recipee per b1..b5, l1..l5, d1..d4), nutrient bounds hold on the
+average of each period (a week by default) and a recipee cannot be repeated
+within a window of consecutive days. Short horizons are solved as one model;
+long horizons with a rolling horizon: overlapping windows are solved in
+turn and their first days are committed.
+"""
+
+import time
+
+import numpy as np
+from scipy import sparse
+
+from Recipee import NUTRIENTS
+from profiles import NUTRITION_BOUNDS
+from model_builder import CATEGORIES, categoryBlock, nutrientBlock, nutrientBounds
+from solver import MatrixModel, INFINITY, OPTIMAL, getBackend
+
+#******************************************************************************
+# HORIZON MODEL
+#******************************************************************************
+
+def horizonModel(book, first, days, bounds = NUTRITION_BOUNDS, period = 7,
+                 repeat_window = 7, history = None, daily = False):
+    """
+    Builds the model of days first, ..., first + days - 1.
+    Input: recipee book, first day, number of days, daily nutrient bounds,
+    days per nutrient averaging period, no-repeat window in days, committed
+    days (dictionary day -> (recipee indices, nutrients vector)), whether
+    the bounds also hold on every single day.
+    Variable d*n + v is recipee-slot v of day first + d.
+    """
+
+    t = time.time()
+
+    if history is None:
+        history = {}
+
+    n = book.numVars()
+    identity = sparse.identity(days, format = 'csr')
+
+    nutrient_names = [k for k in NUTRIENTS if k in bounds]
+    cols = [NUTRIENTS.index(k) for k in nutrient_names]
+    lo, up = nutrientBounds(bounds, nutrient_names)
+    N = nutrientBlock(book.varNutrients(), nutrient_names)
+
+    # At most one recipee per category and day
+    blocks = [sparse.kron(identity, categoryBlock(book))]
+    lower = [np.full(days*len(CATEGORIES), -INFINITY)]
+    upper = [np.ones(days*len(CATEGORIES))]
+
+    # Nutrient averages per period, committed days move to the right hand side
+    day_period = (first + np.arange(days)) // period
+    periods, day_row = np.unique(day_period, return_inverse = True)
+    P = sparse.csr_matrix((np.ones(days), (day_row, np.arange(days))),
+                          shape = (len(periods), days))
+    blocks.append(sparse.kron(P, N))
+
+    for p in periods.tolist():
+        past = [d for d in history if d < first and d // period == p]
+        covered = np.count_nonzero(day_period == p) + len(past)
+        consumed = np.zeros(len(nutrient_names))
+        for d in past:
+            consumed += np.asarray(history[d][1])[cols]
+        lower.append(covered*lo - consumed)
+        upper.append(covered*up - consumed)
+
+    if daily:
+        blocks.append(sparse.kron(identity, N))
+        lower.append(np.tile(lo, days))
+        upper.append(np.tile(up, days))
+
+    # No recipee twice within repeat_window consecutive days
+    ub = np.ones(days*n)
+
+    if repeat_window > 1:
+        R = sparse.csr_matrix((np.ones(n), (book.recipee, np.arange(n))),
+                              shape = (len(book.recipees), n))
+        width = min(repeat_window, days)
+        starts = np.arange(days - width + 1)
+        S = sparse.csr_matrix((np.ones(len(starts)*width),
+                               (np.repeat(np.arange(len(starts)), width),
+                                (starts[:, None] + np.arange(width)).ravel())),
+                              shape = (len(starts), days))
+        blocks.append(sparse.kron(S, R))
+        lower.append(np.full(len(starts)*R.shape[0], -INFINITY))
+        upper.append(np.ones(len(starts)*R.shape[0]))
+
+        for d in range(days):
+            for c in history:
+                if 0 < first + d - c < repeat_window:
+                    used = np.isin(book.recipee, history[c][0])
+                    ub[d*n + np.flatnonzero(used)] = 0
+
+    names = [name + '_d' + str(first + d) for d in range(days) for name in book.names]
+
+    model = MatrixModel(np.tile(book.varCost(), days),
+                        sparse.vstack(blocks, format = 'csr'),
+                        np.concatenate(lower), np.concatenate(upper),
+                        ub = ub, integrality = np.ones(days*n, dtype = int),
+                        names = names, name = 'horizon')
+    model.build_time = time.time() - t
+
+    return model
+
+#******************************************************************************
+# HORIZON PLAN
+#******************************************************************************
+
+class HorizonPlan:
+    """
+    Class to contain a multi-day plan.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty plan.
+        """
+
+        self.status = OPTIMAL
+        self.cost = 0.0
+        self.menus = {}      # day -> list of recipee-slot names
+        self.selected = {}   # day -> recipee-slot variable indices
+        self.totals = {}     # day -> nutrients vector
+        self.windows = []    # one dictionary per solved window
+
+
+    def __str__(self):
+        """
+        As string.
+        """
+
+        plan = "\nstatus: %s\ncost: %g\n" % (self.status, self.cost)
+
+        for day in sorted(self.menus):
+            plan += "\nday %d: %s" % (day, ", ".join(self.menus[day]))
+
+        for window in self.windows:
+            plan += "\nwindow %(first)d-%(last)d: %(status)s, build %(build_time).4fs, solve %(solve_time).4fs" % window
+
+        return plan + "\n"
+
+
+def planHorizon(book, days, bounds = NUTRITION_BOUNDS, period = 7,
+                repeat_window = 7, daily = False, window = None, step = None,
+                backend = 'highs', time_limit = None):
+    """
+    Plans menus for a number of days.
+    Input: recipee book, number of days, daily nutrient bounds, averaging
+    period, no-repeat window, daily bounds flag, rolling window length in
+    days (None solves the whole horizon as one model), days committed per
+    window (default half the window, at most the window), solver backend,
+    time limit per window.
+    Output: HorizonPlan.
+    """
+
+    backend = getBackend(backend)
+    plan = HorizonPlan()
+    history = {}
+    values = book.varNutrients()
+    n = book.numVars()
+
+    if window is None or window >= days:
+        window = step = days
+    if step is None:
+        step = max(1, window // 2)
+    if window < 1 or not 1 <= step <= window:
+        raise ValueError("Rolling horizon needs 1 <= step <= window, not step %s, window %s"
+                         % (step, window))
+
+    first = 0
+
+    while first < days:
+        length = min(window, days - first)
+        model = horizonModel(book, first, length, bounds, period,
+                             repeat_window, history, daily)
+        solution = backend.solve(model, time_limit = time_limit)
+
+        last = days if first + length >= days else first + step
+        plan.windows.append({'first': first, 'last': last - 1,
+                             'status': solution.status,
+                             'build_time': model.build_time + solution.build_time,
+                             'solve_time': solution.solve_time})
+
+        if solution.x is None:
+            plan.status = solution.status
+            break
+        if solution.status != OPTIMAL:
+            plan.status = solution.status
+
+        # Commit days first, ..., last - 1
+        chosen = solution.x.reshape(length, n) > 0.5
+        for d in range(last - first):
+            selected = np.flatnonzero(chosen[d])
+            plan.selected[first + d] = selected
+            plan.menus[first + d] = [book.names[v] for v in selected]
+            plan.totals[first + d] = values[selected].sum(axis = 0)
+            plan.cost += float(book.varCost()[selected].sum())
+            history[first + d] = (book.recipee[selected], plan.totals[first + d])
+
+        first = last
+
+    return plan
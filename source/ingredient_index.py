@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Inverted ingredient -> recipee index for incremental updates. The grams per
+serving of every (recipee, ingredient) pair are kept as a sparse matrix in
+both orientations: by column it lists the recipees using an ingredient, by
+row it recomputes a recipee. A batch of price (or composition) updates
+changes a few ingredient columns of the price vector (nutrient matrix), and
+only the recipees in those columns are recomputed:
+
+    cost[affected] = grams[affected].price
+    nutrients[affected] = grams[affected].composition
+
+The changed recipees are returned with their new values, and modelChanges
+turns them into the objective and matrix coefficients of a resident model.
+"""
+
+import numpy as np
+from scipy import sparse
+
+from Recipee import NUTRIENTS
+from food_index import FoodIndex
+
+#******************************************************************************
+# INGREDIENT INDEX
+#******************************************************************************
+
+class IngredientIndex:
+    """
+    Class to keep recipee costs and nutrients up to date with the cost and
+    food tables. Ingredient names are resolved to table entries through
+    FoodIndex, as in the batch nutrient engine.
+    """
+
+    def __init__(self, recipees, cost_table, food_table = None):
+        """
+        Initialize the index.
+        Input: list of recipees, cost table (dictionary ingredient ->
+        [cost, grams]), food table (dictionary food -> values per 100g;
+        optional, needed for composition updates).
+        """
+
+        self.recipees = recipees
+        self.ingredients = []
+        self.column = column = {}
+        rows = []
+        cols = []
+        grams = []
+
+        for r, recipee in enumerate(recipees):
+            for ingredient, quantity in zip(recipee.foods, recipee.quantities.tolist()):
+                if ingredient not in column:
+                    column[ingredient] = len(self.ingredients)
+                    self.ingredients.append(ingredient)
+                rows.append(r)
+                cols.append(column[ingredient])
+                grams.append(quantity/recipee.servings)
+
+        shape = (len(recipees), len(self.ingredients))
+        self.by_recipee = sparse.csr_matrix((grams, (rows, cols)), shape = shape)
+        self.by_ingredient = self.by_recipee.tocsc()
+
+        self.cost_table = cost_table
+        self.price = np.zeros(len(self.ingredients))
+        self.cost_columns = self.resolve(cost_table)
+        for key, columns in self.cost_columns.items():
+            if key in cost_table:
+                self.price[columns] = cost_table[key][0]/cost_table[key][1]
+        self.raw_cost = self.by_recipee.dot(self.price)
+        self.cost = np.round(self.raw_cost, 2)
+
+        self.food_table = food_table
+        self.composition = None
+        self.nutrients = None
+        self.overrides = {}    # recipee -> {nutrient column: value}
+        if food_table is not None:
+            self.composition = np.zeros((len(self.ingredients), len(NUTRIENTS)))
+            self.food_columns = self.resolve(food_table)
+            for key, columns in self.food_columns.items():
+                if key in food_table:
+                    self.composition[columns] = self.perGram(food_table[key])
+            self.nutrients = np.asarray(self.by_recipee.dot(self.composition))
+
+
+    def resolve(self, table):
+        """
+        Returns a dictionary table key -> ingredient columns. Ingredients
+        missing from the table are kept under their own name, so a later
+        update that adds them is picked up.
+        """
+
+        index = FoodIndex(table)
+        columns = {}
+        for j, ingredient in enumerate(self.ingredients):
+            key = index.resolve(ingredient) or ingredient
+            columns.setdefault(key, []).append(j)
+        return columns
+
+
+    def perGram(self, values):
+        """
+        Returns a food table row (per 100g) as a vector per gram.
+        """
+
+        row = np.zeros(len(NUTRIENTS))
+        values = values[:len(NUTRIENTS)]
+        row[:len(values)] = values
+        return row/100.0
+
+
+    def recipeesUsing(self, ingredient):
+        """
+        Returns the recipees using an ingredient.
+        Output: list of (recipee index, grams per serving).
+        """
+
+        if ingredient not in self.column:
+            return []
+        j = self.column[ingredient]
+        start, stop = self.by_ingredient.indptr[j], self.by_ingredient.indptr[j + 1]
+        return list(zip(self.by_ingredient.indices[start:stop].tolist(),
+                        self.by_ingredient.data[start:stop].tolist()))
+
+
+    def affected(self, columns):
+        """
+        Returns the sorted recipees using any of the ingredient columns.
+        """
+
+        indptr = self.by_ingredient.indptr
+        indices = self.by_ingredient.indices
+        parts = [indices[indptr[j]:indptr[j + 1]] for j in columns]
+        if not parts:
+            return np.array([], dtype = int)
+        return np.unique(np.concatenate(parts))
+
+
+    def columnsOf(self, keys, table_columns, table, new):
+        """
+        Returns the ingredient columns of updated table keys. Keys new to the
+        table make the ingredients resolve again.
+        """
+
+        if new:
+            table_columns.clear()
+            table_columns.update(self.resolve(table))
+
+        columns = []
+        for key in keys:
+            columns.extend(table_columns.get(key, []))
+        return columns
+
+
+    def updatePrices(self, prices):
+        """
+        Applies a batch of price updates.
+        Input: dictionary ingredient -> [food cost, grams] (cost table
+        entries).
+        Output: dictionary with the changed recipees (indices) and their new
+        cost per serving.
+        """
+
+        new = any(key not in self.cost_table for key in prices)
+        self.cost_table.update(prices)
+        columns = self.columnsOf(prices, self.cost_columns, self.cost_table, new)
+        for key in prices:
+            cols = self.cost_columns.get(key, [])
+            self.price[cols] = prices[key][0]/prices[key][1]
+
+        rows = self.affected(columns)
+        self.raw_cost[rows] = self.by_recipee[rows].dot(self.price)
+        cost = np.round(self.raw_cost[rows], 2)
+        changed = cost != self.cost[rows]
+        rows = rows[changed]
+        self.cost[rows] = cost[changed]
+
+        for r in rows.tolist():
+            self.recipees[r].cost = float(self.cost[r])
+
+        return {'recipees': rows, 'cost': self.cost[rows]}
+
+
+    def updateComposition(self, foods):
+        """
+        Applies a batch of food composition corrections.
+        Input: dictionary food -> values per 100g (food table rows).
+        Output: dictionary with the changed recipees (indices) and their new
+        nutrients per serving (recipees x nutrients).
+        """
+
+        if self.food_table is None:
+            raise ValueError("Composition updates need the food table")
+
+        new = any(key not in self.food_table for key in foods)
+        self.food_table.update(foods)
+        columns = self.columnsOf(foods, self.food_columns, self.food_table, new)
+        for key in foods:
+            cols = self.food_columns.get(key, [])
+            self.composition[cols] = self.perGram(foods[key])
+
+        rows = self.affected(columns)
+        nutrients = np.asarray(self.by_recipee[rows].dot(self.composition))
+        for k, r in enumerate(rows.tolist()):
+            for col, value in self.overrides.get(r, {}).items():
+                nutrients[k, col] = value
+        changed = np.any(nutrients != self.nutrients[rows], axis = 1)
+        rows = rows[changed]
+        self.nutrients[rows] = nutrients[changed]
+
+        for r in rows.tolist():
+            self.recipees[r].values[:] = self.nutrients[r]
+
+        return {'recipees': rows, 'nutrients': self.nutrients[rows]}
+
+
+    def overrideNutrients(self, recipee, nutrients):
+        """
+        Sets nutrients of a recipee by hand. Overrides are kept, so later
+        composition updates recompute the other nutrients only.
+        Input: recipee index, dictionary nutrient -> value per serving.
+        Output: dictionary with the changed recipee and its nutrients (see
+        updateComposition).
+        """
+
+        unknown = [nutrient for nutrient in nutrients if nutrient not in NUTRIENTS]
+        if unknown:
+            raise ValueError("Unknown nutrient(s) %s" % ', '.join(unknown))
+
+        override = self.overrides.setdefault(recipee, {})
+        values = self.recipees[recipee].values
+        for nutrient, value in nutrients.items():
+            col = NUTRIENTS.index(nutrient)
+            override[col] = float(value)
+            values[col] = value
+            if self.nutrients is not None:
+                self.nutrients[recipee, col] = value
+
+        return {'recipees': np.array([recipee]), 'nutrients': values[None, :].copy()}
+
+#******************************************************************************
+# HELPER FUNCTIONS
+#******************************************************************************
+
+def modelChanges(book, model, formulation, changes, intake = None):
+    """
+    Returns the model coefficients changed by an update.
+    Input: recipee book, matrix model built from it, formulation, changes
+    returned by updatePrices or updateComposition, recommended intake
+    (mip3).
+    Output: dictionary with objective (variable columns, values) and matrix
+    (rows, columns, values) changes.
+    """
+
+    rows = np.asarray(changes['recipees'], dtype = int)
+
+    # Variables of the changed recipees
+    if formulation == 'lp':
+        columns = rows
+        recipee = np.arange(len(rows))
+    else:
+        where = np.zeros(len(book.recipees), dtype = int) - 1
+        where[rows] = np.arange(len(rows))
+        columns = np.flatnonzero(where[book.recipee] >= 0)
+        recipee = where[book.recipee[columns]]
+
+    result = {'objective': (np.array([], dtype = int), np.array([])),
+              'matrix': (np.array([], dtype = int), np.array([], dtype = int),
+                         np.array([]))}
+
+    if 'cost' in changes and formulation != 'mip3':
+        result['objective'] = (columns, np.asarray(changes['cost'])[recipee])
+
+    if 'nutrients' in changes:
+        values = np.asarray(changes['nutrients'])[recipee]
+        if formulation == 'mip3':
+            cols = [NUTRIENTS.index(n) for n in NUTRIENTS if n in intake]
+            result['objective'] = (columns, -values[:, cols].sum(axis = 1))
+        else:
+            model_rows = [i for i, n in enumerate(model.row_names) if n in NUTRIENTS]
+            cols = [NUTRIENTS.index(model.row_names[i]) for i in model_rows]
+            result['matrix'] = (np.repeat(np.array(model_rows, dtype = int), len(columns)),
+                                np.tile(columns, len(model_rows)),
+                                values[:, cols].T.ravel())
+
+    return result
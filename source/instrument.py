@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Stage-level instrumentation. Named spans around the stages of a planning run
+(recipeeBuilder, recipeeBook, constraint construction, model write,
+optimize, computeIIS) record wall time, CPU time, peak memory, object
+counts and attributes (formulation, backend). Finished spans are passed to
+registered callbacks and, if an output is set (or the MENU_PLANNING_SPANS
+environment variable names a file), written as json lines.
+
+tracemalloc and the CPU clock are process-wide: span peaks are only traced
+on the main thread (a span in another thread, e.g. a background export,
+would reset the peak of the stage running next to it), and cpu_time counts
+every thread.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Callbacks receiving every finished span (a dictionary)
+HOOKS = []
+
+STATE = threading.local()
+OUTPUT = {'stream': None, 'lock': threading.Lock()}
+
+#******************************************************************************
+# CONFIGURATION
+#******************************************************************************
+
+def addHook(callback):
+    """
+    Registers a callback called with every finished span.
+    """
+    HOOKS.append(callback)
+
+
+def removeHook(callback):
+    """
+    Unregisters a callback.
+    """
+    HOOKS.remove(callback)
+
+
+def setOutput(output):
+    """
+    Sets where spans are written as json lines: a file name (appended to),
+    an open text stream, or None to stop writing.
+    """
+
+    stream = OUTPUT['stream']
+    if stream is not None and stream not in (sys.stdout, sys.stderr) and OUTPUT.get('owned'):
+        stream.close()
+
+    OUTPUT['owned'] = isinstance(output, str)
+    if OUTPUT['owned']:
+        output = open(output, 'a')
+    OUTPUT['stream'] = output
+
+
+def traceMemory(enable = True):
+    """
+    Starts (stops) tracemalloc so spans report Python peak memory. Without
+    it, spans report the process maximum resident size.
+    """
+
+    if enable and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not enable and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def stack():
+    """
+    Returns the open spans of the current thread.
+    """
+
+    if not hasattr(STATE, 'stack'):
+        STATE.stack = []
+        STATE.request = None
+    return STATE.stack
+
+
+def emit(record):
+    """
+    Sends a finished span to the hooks and the output.
+    """
+
+    for callback in list(HOOKS):
+        callback(record)
+
+    stream = OUTPUT['stream']
+    if stream is not None:
+        line = json.dumps(record, default = str)
+        with OUTPUT['lock']:
+            stream.write(line + '\n')
+            stream.flush()
+
+#******************************************************************************
+# SPANS
+#******************************************************************************
+
+@contextmanager
+def request(request_id):
+    """
+    Tags every span opened inside with a request id.
+    """
+
+    stack()
+    previous = STATE.request
+    STATE.request = request_id
+    try:
+        yield
+    finally:
+        STATE.request = previous
+
+
+@contextmanager
+def span(name, counts = None, **attributes):
+    """
+    Records a stage.
+    Input: span name, dictionary of object counts known up front (counts
+    found inside the stage can be added to the yielded dictionary's
+    'counts'), attributes of the stage (e.g. formulation = 'mip2').
+    Output (record): peak_bytes with memory tracing on the main thread,
+    otherwise process_max_rss_kb, the resident size peak of the whole
+    process so far (not of the stage).
+    """
+
+    spans = stack()
+    main = threading.current_thread() is threading.main_thread()
+    record = {'span': name,
+              'request': STATE.request,
+              'parent': spans[-1]['span'] if spans else None,
+              'thread': None if main else threading.current_thread().name,
+              'counts': dict(counts or {}),
+              'attributes': dict(attributes)}
+
+    tracing = main and tracemalloc.is_tracing()
+    if tracing:
+        # Open spans keep the peak reached so far, then the peak is reset
+        peak = tracemalloc.get_traced_memory()[1]
+        for parent in spans:
+            parent['peak_bytes'] = max(parent.get('peak_bytes', 0), peak)
+        tracemalloc.reset_peak()
+        record['peak_bytes'] = 0
+
+    spans.append(record)
+    start = time.time()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+
+    try:
+        yield record
+    finally:
+        record['start'] = start
+        record['wall_time'] = time.perf_counter() - wall
+        record['cpu_time'] = time.process_time() - cpu
+        spans.pop()
+
+        if tracing and tracemalloc.is_tracing():
+            peak = max(record['peak_bytes'], tracemalloc.get_traced_memory()[1])
+            record['peak_bytes'] = peak
+            for parent in spans:
+                parent['peak_bytes'] = max(parent.get('peak_bytes', 0), peak)
+        elif resource is not None:
+            record['process_max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        emit(record)
+
+
+if os.environ.get('MENU_PLANNING_SPANS'):
+    setOutput(os.environ['MENU_PLANNING_SPANS'])
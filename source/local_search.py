@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Solver-free local search over the category slots (mip2, mip3). A menu is one
+recipee-slot (or none) per category b1..b5, l1..l5, d1..d4. Simulated
+annealing redraws the recipee of one slot at a time and keeps the running
+nutrient totals, so every option of the slot is scored from one update
+
+    totals[option] = totals - nutrients[old] + nutrients[option]
+
+as objective + penalty x (bound violations relative to the bounds).
+Restarts run in parallel under a time budget; the best menu is returned,
+with its gap to the exact model when a solver is available.
+
+Starting a worker pool costs tens of milliseconds (forked) to about a second
+(spawned), more than the default 10 ms budget. Budgets under POOL_BUDGET run
+the restarts in this process, each with its share of the budget: the menu is
+then about as good as one restart with that share, not as good as the
+parallel restarts with the full budget. On the recipee book with relaxed
+bounds, 10 ms lands tens of percent above the optimum and 1 s within a few
+percent; budgetGaps measures the gap per budget.
+"""
+
+import multiprocessing
+import time
+
+import numpy as np
+
+from model_builder import CATEGORIES
+from solver import (getBackend, Solution, MAXIMIZE, OPTIMAL, FEASIBLE,
+                    TIME_LIMIT)
+
+# Default time budget in seconds
+BUDGET = 0.01
+
+# Smallest budget in seconds worth starting worker processes for
+POOL_BUDGET = 0.5
+
+# Worker state, set once per process by initWorker
+WORKER = {}
+
+#******************************************************************************
+# HELPER FUNCTIONS
+#******************************************************************************
+
+def slotProblem(model, penalty = None):
+    """
+    Extracts the slot structure of a matrix model with category rows.
+    Input: matrix model (mip2, mip3), penalty per unit of relative bound
+    violation (default ten times the most expensive menu).
+    Output: dictionary with the objective (to minimize), the candidate
+    variables of every slot, the variables x bounded rows matrix, row
+    bounds, the weight of each row (one over its bound) and the penalty.
+    """
+
+    names = model.row_names or []
+    category = np.array([name in CATEGORIES for name in names], dtype = bool)
+    if not category.any():
+        raise ValueError("Local search needs the category rows of mip2 or mip3")
+
+    block = model.A[np.flatnonzero(category)].tocsc()
+    if np.any(np.diff(block.indptr) != 1):
+        raise ValueError("Every variable must belong to exactly one category")
+    slot = block.indices
+
+    rows = np.flatnonzero(~category)
+    lower = model.row_lower[rows]
+    upper = model.row_upper[rows]
+    bound = np.where(np.isfinite(lower), np.abs(lower), 0)
+    bound = np.maximum(bound, np.where(np.isfinite(upper), np.abs(upper), 0))
+
+    c = -model.c if model.sense == MAXIMIZE else model.c
+    candidates = [np.flatnonzero(slot == s) for s in range(category.sum())]
+    candidates = [cands for cands in candidates if len(cands)]
+
+    if penalty is None:
+        penalty = 10*max(1.0, sum(np.abs(c[cands]).max() for cands in candidates))
+
+    return {'c': c, 'candidates': candidates,
+            'values': model.A[rows].T.toarray(), 'lower': lower,
+            'upper': upper, 'weight': 1/np.maximum(bound, 1.0),
+            'penalty': penalty, 'n': model.numVars()}
+
+
+def violation(problem, totals):
+    """
+    Returns the bound violations of nutrient totals (one row per menu),
+    relative to the bounds.
+    """
+
+    inside = np.minimum(np.maximum(totals, problem['lower']), problem['upper'])
+    return np.abs(totals - inside).dot(problem['weight'])
+
+
+def temperatures(option_c):
+    """
+    Returns the starting and final annealing temperatures, on the scale of
+    the objective alone (the penalty term would make the start a random
+    walk): the mean spread of the options of a slot, and the smallest
+    difference between two options of a slot.
+    """
+
+    spreads = [float(np.ptp(costs)) for costs in option_c]
+    steps = [np.diff(np.unique(costs)) for costs in option_c]
+    steps = np.concatenate(steps) if steps else np.array([])
+    steps = steps[steps > 1e-9]
+
+    initial = max(float(np.mean(spreads)) if spreads else 0.0, 1e-9)
+    final = min(float(steps.min()) if len(steps) else initial*1e-3, initial)
+    return initial, final
+
+
+def anneal(problem, seed, budget, start = None, tolerance = 1e-6):
+    """
+    One simulated annealing run. Every step takes one slot and draws its
+    recipee among all of its candidates (or none) with Boltzmann
+    probabilities, scoring them together from the running totals.
+    Input: slot problem, random seed, time budget in seconds, starting
+    variable vector (optional), bound tolerance.
+    Output: (score, objective, violation, chosen variables) of the best menu
+    found, menus within the bounds first.
+    """
+
+    t = time.time()
+    rng = np.random.default_rng(seed)
+    c = problem['c']
+    values = problem['values']
+    penalty = problem['penalty']
+    candidates = problem['candidates']
+
+    # Candidates of every slot plus the empty choice (-1, last)
+    options = [np.append(cands, -1) for cands in candidates]
+    option_c = [np.append(c[cands], 0.0) for cands in candidates]
+    option_values = [np.vstack([values[cands], np.zeros(values.shape[1])])
+                     for cands in candidates]
+
+    # One option per slot
+    if start is not None:
+        chosen = np.asarray(start) > 0.5
+        choice = [int(np.argmax(chosen[cands])) if chosen[cands].any() else len(cands)
+                  for cands in candidates]
+    else:
+        choice = [int(rng.integers(len(cands))) for cands in candidates]
+
+    totals = np.zeros(values.shape[1])
+    objective = 0.0
+    for s, k in enumerate(choice):
+        totals += option_values[s][k]
+        objective += option_c[s][k]
+    excess = float(violation(problem, totals[None, :])[0])
+
+    best = (objective + penalty*excess, objective, excess, list(choice))
+    rank = (excess > tolerance, best[0])
+    initial, final = temperatures(option_c)
+    temperature = initial
+    steps = 0
+
+    while True:
+        if steps % 16 == 0:
+            elapsed = time.time() - t
+            if elapsed >= budget:
+                break
+            # Geometric cooling over the budget
+            temperature = initial*(final/initial)**(elapsed/budget)
+        steps += 1
+
+        s = int(rng.integers(len(candidates)))
+        k = choice[s]
+
+        # Incremental update: totals without the slot, plus every option
+        base = totals - option_values[s][k]
+        base_objective = objective - option_c[s][k]
+        new_totals = base + option_values[s]
+        new_excess = violation(problem, new_totals)
+        scores = base_objective + option_c[s] + penalty*new_excess
+
+        low = scores.min()
+        weights = np.exp((low - scores)/temperature)
+        k = int(np.searchsorted(np.cumsum(weights), rng.random()*weights.sum()))
+        k = min(k, len(scores) - 1)
+
+        choice[s] = k
+        totals = new_totals[k]
+        objective = base_objective + option_c[s][k]
+        excess = float(new_excess[k])
+        score = float(scores[k])
+        if (excess > tolerance, score) < rank:
+            best = (score, objective, excess, list(choice))
+            rank = (excess > tolerance, score)
+
+    # Polish the best menu: best option of every slot until none improves
+    score, objective, excess, choice = best
+    totals = sum(option_values[s][k] for s, k in enumerate(choice))
+    improved = True
+    while improved:
+        improved = False
+        for s, k in enumerate(choice):
+            base = totals - option_values[s][k]
+            base_objective = objective - option_c[s][k]
+            new_totals = base + option_values[s]
+            new_excess = violation(problem, new_totals)
+            scores = base_objective + option_c[s] + penalty*new_excess
+            feasible = new_excess <= tolerance
+            if excess <= tolerance:
+                scores = np.where(feasible, scores, np.inf)
+            j = int(np.argmin(scores))
+            if scores[j] < score - 1e-9:
+                choice[s] = j
+                totals = new_totals[j]
+                objective = base_objective + option_c[s][j]
+                excess = float(new_excess[j])
+                score = float(scores[j])
+                improved = True
+
+    return score, objective, excess, [int(options[s][k]) for s, k in enumerate(choice)]
+
+#******************************************************************************
+# WORKERS
+#******************************************************************************
+
+def initWorker(problem, budget, start, tolerance):
+    """
+    Stores the slot problem in the worker process.
+    """
+
+    WORKER['problem'] = problem
+    WORKER['budget'] = budget
+    WORKER['start'] = start
+    WORKER['tolerance'] = tolerance
+
+
+def runRestart(job):
+    """
+    Runs one annealing restart.
+    Input: (seed, whether to start from the start vector).
+    """
+
+    seed, first = job
+    start = WORKER['start'] if first else None
+    return anneal(WORKER['problem'], seed, WORKER['budget'], start,
+                  WORKER['tolerance'])
+
+#******************************************************************************
+# LOCAL SEARCH
+#******************************************************************************
+
+def localSearch(model, budget = BUDGET, restarts = None, processes = 1,
+                seed = 0, penalty = None, start = None, tolerance = 1e-6,
+                exact = None):
+    """
+    Finds a menu by simulated annealing.
+    Input: matrix model (mip2, mip3), time budget in seconds, number of
+    restarts (default one per process), worker processes (1, or a budget
+    under POOL_BUDGET, runs the restarts in this process, splitting the
+    budget), random seed, penalty
+    per unit of relative bound violation, starting variable vector, bound
+    tolerance, exact solver backend (or a solved Solution) for the gap.
+    Output: (Solution, dictionary with restarts, scores, violation, exact
+    objective and gap). The status is feasible when every bound is met,
+    time_limit otherwise (x is then the least violating menu found).
+    """
+
+    t = time.time()
+    problem = slotProblem(model, penalty)
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if restarts is None:
+        restarts = processes
+    jobs = [(seed + i, i == 0) for i in range(restarts)]
+
+    if processes == 1 or budget < POOL_BUDGET:
+        initWorker(problem, budget/restarts, start, tolerance)
+        results = [runRestart(job) for job in jobs]
+    else:
+        pool = multiprocessing.Pool(min(processes, restarts), initWorker,
+                                    (problem, budget, start, tolerance))
+        try:
+            results = pool.map(runRestart, jobs)
+        finally:
+            pool.close()
+            pool.join()
+
+    score, objective, excess, choice = min(
+        results, key = lambda result: (result[2] > tolerance, result[0]))
+
+    x = np.zeros(problem['n'])
+    x[[j for j in choice if j >= 0]] = 1
+    status = FEASIBLE if excess <= tolerance else TIME_LIMIT
+    solution = Solution(status, x, float(np.dot(model.c, x)) + model.offset,
+                        solve_time = time.time() - t, backend = 'local')
+
+    report = {'restarts': restarts, 'scores': [result[0] for result in results],
+              'violation': excess, 'exact': None, 'gap': None}
+
+    if exact is not None:
+        if not isinstance(exact, Solution):
+            try:
+                exact = getBackend(exact).solve(model)
+            except ImportError:
+                exact = None
+        if exact is not None and exact.status == OPTIMAL:
+            report['exact'] = exact.objVal
+            report['gap'] = abs(solution.objVal - exact.objVal)/max(abs(exact.objVal), 1e-9)
+
+    return solution, report
+
+
+def budgetGaps(model, budgets = (0.01, 0.1, 1.0), seeds = 5, exact = 'highs',
+               tolerance = 1e-6):
+    """
+    Checks that the annealing schedule uses its budget: runs seeds restarts
+    at every budget and compares the median objective with the exact one.
+    Input: matrix model (mip2, mip3), increasing time budgets, restarts per
+    budget, exact solver backend (or a solved Solution), bound tolerance.
+    Output: dictionary with rows (budget, median objective, median gap,
+    feasible runs), the exact objective and shrinking (the median gap never
+    grows with the budget).
+    """
+
+    if not isinstance(exact, Solution):
+        exact = getBackend(exact).solve(model)
+    if exact.status != OPTIMAL:
+        raise ValueError("The exact model is %s, no gap to measure" % exact.status)
+
+    problem = slotProblem(model)
+    sign = -1 if model.sense == MAXIMIZE else 1
+    rows = []
+
+    for budget in budgets:
+        objectives = []
+        for seed in range(seeds):
+            score, objective, excess, choice = anneal(problem, seed, budget,
+                                                      tolerance = tolerance)
+            objectives.append(sign*objective + model.offset if excess <= tolerance
+                              else np.nan)
+        objectives = np.array(objectives)
+        gaps = np.abs(objectives - exact.objVal)/max(abs(exact.objVal), 1e-9)
+        gaps[np.isnan(gaps)] = np.inf
+        rows.append({'budget': budget, 'objVal': float(np.median(objectives)),
+                     'gap': float(np.median(gaps)),
+                     'feasible': int(np.sum(~np.isnan(objectives)))})
+
+    gaps = [row['gap'] for row in rows]
+    return {'rows': rows, 'exact': exact.objVal,
+            'shrinking': all(b <= a + 1e-9 for a, b in zip(gaps, gaps[1:]))}
+
+
+def printBudgetGaps(result):
+    """
+    Prints the gap of every budget.
+    """
+
+    print('\nExact objective %g' % result['exact'])
+    for row in result['rows']:
+        print('Budget %(budget)gs: median objective %(objVal)g, gap %(gap).4f, '
+              '%(feasible)d feasible' % row)
+    print('Gap shrinks with the budget: %s' % result['shrinking'])
+
+
+def printLocalSearch(solution, report, names = None):
+    """
+    Prints a local search result.
+    """
+
+    print('\n%s' % solution)
+    print('Restarts: %d, best score %g, violation %g' % (
+        report['restarts'], min(report['scores']), report['violation']))
+    if report['gap'] is not None:
+        print('Exact objective %g, gap %.4f%%' % (report['exact'], 100*report['gap']))
+    if names is not None:
+        for name in solution.selected(names):
+            print(name)
@@ -5,96 +5,88 @@ Created on Mon May  6 13:11:01 2019
 @author: caleb
 """
 
-from gurobipy import *
+import time
+
 from Recipee import *
+from profiles import NUTRITION_BOUNDS
+from model_builder import Book, buildModel
+from solver import GurobiBackend
+from instrument import span
+from registry import exportModel
+
+EXPORT = 'menu_planning_lp.mps.gz'
+
+
+def printSolution(m, buy, foods, model, build_time):
+    from gurobipy import GRB
 
-# Nutrition guidelines, based on
-# http://www.nutripac.com.mx/software/rec-mex.pdf
-# Hombres: 25-65
-
-categories, minNutrition, maxNutrition = multidict({
-             'agua': [0, GRB.INFINITY],
-             'energia': [1800, 2700], 
-             'proteina': [46, 56], 
-             'grasa_total': [28, 43], 
-             'carbohidratos': [0, GRB.INFINITY], 
-             'fibra_dietetica': [18, 24],
-             'ceniza': [0, GRB.INFINITY],
-             'calcio': [800, GRB.INFINITY], 
-             'fosforo': [800, GRB.INFINITY], 
-             'hierro': [15, GRB.INFINITY], 
-             'tiamina': [1.5, GRB.INFINITY], 
-             'riboflavina': [1.7, GRB.INFINITY], 
-             'niacina': [20, GRB.INFINITY],
-             'vitamina_c': [60, GRB.INFINITY], 
-             'vitamina_a_rae': [1000, GRB.INFINITY], 
-             'ac_graso_mono': [0, GRB.INFINITY], 
-             'ac_graso_poli': [0, GRB.INFINITY],
-             'ac_graso_sat':[0, GRB.INFINITY], 
-             'colesterol': [0, 300], 
-             'potasio': [2000, GRB.INFINITY], 
-             'sodio': [0, 2500], 
-             'zinc': [15, GRB.INFINITY],
-             'magnesio': [350, GRB.INFINITY], 
-             'vitamina_b6': [2, GRB.INFINITY], 
-             'vitamina_b12': [2, GRB.INFINITY], 
-             'acido_folico': [200, GRB.INFINITY], 
-             'folato': [0, GRB.INFINITY]})
-
-
-# Read recipees
-recipees, food_table, cost_table = recipeeBuilder()
-
-# Build a dictionary with food costs
-recipee_cost = {}
-for recipee in recipees:
-    recipee_cost[recipee.name] = recipee.cost
-
-foods, cost = multidict(recipee_cost)
-
-# Build a dictionary with nutrition values
-nutrition_values = {}
-for recipee in recipees:
-    for nutrient in NUTRIENTS:
-        nutrition_values[(recipee.name, nutrient)] = recipee.nutrients[nutrient]
-
-# Model
-m = Model("diet")
-
-# Create decision variables for the foods to buy
-buy = m.addVars(foods, name="buy")
-
-# The objective is to minimize the costs
-m.setObjective(buy.prod(cost), GRB.MINIMIZE)
-
-# Nutrition constraints
-m.addConstrs(
-    (quicksum(nutrition_values[f,c] * buy[f] for f in foods)
-    	== [minNutrition[c], maxNutrition[c]]
-     for c in categories), "_")
-
-
-def printSolution():
     if m.status == GRB.Status.OPTIMAL:
         print('\nCost: %g' % m.objVal)
         print('\nBuy:')
-        buyx = m.getAttr('x', buy)
-        for f in foods:
-            if buy[f].x > 0.0001:
-                print('%s %g' % (f, buyx[f]))
+        buyx = buy.X
+        for i, f in enumerate(foods):
+            if buyx[i] > 0.0001:
+                print('%s %g' % (f, buyx[i]))
     else:
         print('No solution')
-
-# Print model
-m.write("menu_planning_lp.lp")
-
-# Solve
-m.optimize()
-printSolution()
-
-# Irreducible Infeasible Sets (IIS)
-m.computeIIS()
-print('\nThe following constraint(s) cannot be satisfied:')
-for c in m.getConstrs():
-    if c.IISConstr:
-        print('%s' % c.constrName)
+    print('\nBuild time: %.4fs (matrices) + %.4fs (gurobi)' % (model.build_time, build_time))
+    print('Solve time: %.4fs' % m.Runtime)
+
+
+def main():
+    """
+    Builds and solves the lp model with gurobipy.
+    """
+
+    from gurobipy import GRB
+
+    # Read recipees
+    with span('recipeeBuilder') as stage:
+        recipees, food_table, cost_table = recipeeBuilder()
+        stage['counts']['recipees'] = len(recipees)
+
+    with span('recipeeBook') as stage:
+        book = Book(recipees)
+        foods = book.recipees
+        stage['counts']['vars'] = len(book.recipees)
+
+    # Nutrition guidelines, based on
+    # http://www.nutripac.com.mx/software/rec-mex.pdf
+    # Hombres: 25-65
+    # Nutrition constraints: one row per nutrient over the recipees
+    with span('constraints') as stage:
+        model = buildModel(book, 'lp', NUTRITION_BOUNDS)
+        t = time.time()
+        m, buy = GurobiBackend().build(model, verbose = True)
+        build_time = time.time() - t
+        stage['counts']['constrs'] = model.numConstrs()
+        stage['counts']['nonzeros'] = model.A.nnz
+
+    # Write model (compressed MPS with integer ids, names in a side table) in
+    # the background; set EXPORT to None to skip it
+    exporter = exportModel(model, EXPORT, None) if EXPORT else None
+
+    # Solve
+    with span('optimize'):
+        m.optimize()
+
+    if exporter is not None:
+        exporter.join()
+
+    printSolution(m, buy, foods, model, build_time)
+
+    # Irreducible Infeasible Sets (IIS) only explain an infeasible model;
+    # Gurobi refuses an IIS of a feasible one
+    if m.status not in (GRB.Status.INFEASIBLE, GRB.Status.INF_OR_UNBD):
+        return
+
+    with span('computeIIS'):
+        m.computeIIS()
+    print('\nThe following constraint(s) cannot be satisfied:')
+    for c in m.getConstrs():
+        if c.IISConstr:
+            print('%s' % c.constrName)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Matrix-form model builder. The recipee book (recipee-slot variables, their
+costs and nutrients) is kept as arrays, and the nutrient block and the
+category assignment block of the lp/mip/mip2/mip3 formulations are
+assembled as sparse matrices instead of per-term expressions.
+"""
+
+import time
+
+import numpy as np
+from scipy import sparse
+
+from Recipee import NUTRIENTS
+from profiles import NUTRITION_BOUNDS, NUTRIENT_INTAKE
+from solver import MatrixModel, INFINITY, MINIMIZE
+from registry import Registry
+
+MEALS = ['b', 'l', 'd']
+
+CATEGORIES = ['b1', 'b2', 'b3', 'b4', 'b5',
+              'l1', 'l2', 'l3', 'l4', 'l5',
+              'd1', 'd2', 'd3', 'd4']
+
+FORMULATIONS = ['lp', 'mip', 'mip2', 'mip3']
+
+#******************************************************************************
+# RECIPEE BOOK
+#******************************************************************************
+
+class Book:
+    """
+    Matrix form of recipeeBook.
+    Recipee level: names, cost vector, recipees x nutrients matrix.
+    Variable level (one per recipee-slot pair): names, recipee index,
+    category index.
+    """
+
+    def __init__(self, recipees, nutrients = None):
+        """
+        Classifies recipees into the categories b1..b5, l1..l5, d1..d4.
+        Input: list of recipees, recipees x nutrients array (optional, as
+        returned by catalogNutrients).
+        """
+
+        self.recipees = [recipee.name for recipee in recipees]
+        self.cost = np.array([recipee.cost for recipee in recipees], dtype = float)
+
+        if nutrients is None:
+            nutrients = [recipee.values for recipee in recipees]
+        self.nutrients = np.asarray(nutrients, dtype = float).reshape(-1, len(NUTRIENTS))
+
+        # Recipee-slot pairs, in recipee order then meal order
+        classification = np.zeros((len(recipees), len(MEALS)), dtype = int)
+        for r, recipee in enumerate(recipees):
+            classification[r, :len(recipee.classification)] = recipee.classification[:len(MEALS)]
+
+        # Category index: first category of the meal + subcategory - 1
+        first = np.cumsum([0] + [sum(1 for key in CATEGORIES if key[0] == meal)
+                                 for meal in MEALS])
+        self.recipee, meal = np.nonzero(classification)
+        sub = classification[self.recipee, meal]
+        if np.any(sub > first[meal + 1] - first[meal]):
+            r = self.recipee[np.argmax(sub > first[meal + 1] - first[meal])]
+            raise ValueError("Unknown category in recipee %s" % self.recipees[r])
+        self.slot = first[meal] + sub - 1
+
+        # Integer ids of the recipee-slot pairs, names built on demand
+        self.registry = Registry(self.recipees, self.recipee, self.slot, CATEGORIES)
+
+
+    @property
+    def names(self):
+        """
+        Variable names (recipee_slot), from the registry.
+        """
+        return self.registry.names()
+
+
+    def numVars(self):
+        """
+        Returns number of recipee-slot variables.
+        """
+        return len(self.registry)
+
+
+    def varCost(self):
+        """
+        Returns cost vector of the recipee-slot variables.
+        """
+        return self.cost[self.recipee]
+
+
+    def varNutrients(self):
+        """
+        Returns variables x nutrients matrix.
+        """
+        return self.nutrients[self.recipee]
+
+
+    def category(self):
+        """
+        Returns dictionary category -> list of variable names, as recipeeBook.
+        """
+
+        category = dict((key, []) for key in CATEGORIES)
+        for name, slot in zip(self.names, self.slot.tolist()):
+            category[CATEGORIES[slot]].append(name)
+
+        return category
+
+#******************************************************************************
+# MATRIX BLOCKS
+#******************************************************************************
+
+def nutrientBlock(nutrients, names = NUTRIENTS):
+    """
+    Returns nutrient rows (selected nutrients x variables) as a sparse matrix.
+    Input: variables x nutrients matrix, nutrients to keep.
+    """
+
+    cols = [NUTRIENTS.index(n) for n in names]
+    return sparse.csr_matrix(nutrients[:, cols].T)
+
+
+def categoryBlock(book, columns = None):
+    """
+    Returns category rows (categories x variables), one nonzero per variable.
+    Input: recipee book, variable indices to keep (default all).
+    """
+
+    slot = book.slot if columns is None else book.slot[columns]
+    n = len(slot)
+    return sparse.csr_matrix((np.ones(n), (slot, np.arange(n))),
+                             shape = (len(CATEGORIES), n))
+
+
+def nutrientBounds(bounds, names = NUTRIENTS):
+    """
+    Returns lower and upper bound vectors for the selected nutrients.
+    """
+
+    lower = np.array([bounds[n][0] for n in names], dtype = float)
+    upper = np.array([bounds[n][1] for n in names], dtype = float)
+    return lower, upper
+
+#******************************************************************************
+# MODEL BUILDER
+#******************************************************************************
+
+def buildModel(book, formulation = 'mip2', bounds = NUTRITION_BOUNDS,
+               intake = NUTRIENT_INTAKE, columns = None):
+    """
+    Builds a matrix model.
+    Input: recipee book, formulation (lp, mip, mip2, mip3), nutrient bounds
+    (lp, mip, mip2), recommended nutrient intake (mip3), recipee-slot
+    variables to keep (mip, mip2, mip3; default all, see
+    column_generation).
+    lp:   continuous amount of each recipee, minimize cost s.t. nutrients.
+    mip:  one binary per recipee-slot, minimize cost s.t. nutrients.
+    mip2: mip plus at most one recipee per category.
+    mip3: at most one recipee per category, minimize intake deviation.
+    Output: MatrixModel; build time in seconds in model.build_time.
+    """
+
+    if formulation not in FORMULATIONS:
+        raise ValueError("Unknown formulation %s" % formulation)
+
+    t = time.time()
+
+    if formulation == 'lp':
+        nutrient_names = [n for n in NUTRIENTS if n in bounds]
+        lower, upper = nutrientBounds(bounds, nutrient_names)
+        model = MatrixModel(book.cost, nutrientBlock(book.nutrients, nutrient_names),
+                            lower, upper, names = list(book.recipees),
+                            row_names = nutrient_names, name = 'diet')
+        model.build_time = time.time() - t
+        return model
+
+    if columns is None:
+        recipee = book.recipee
+        names = book.names
+    else:
+        columns = np.asarray(columns, dtype = int)
+        recipee = book.recipee[columns]
+        names = [book.registry.name(j) for j in columns.tolist()]
+
+    n = len(recipee)
+    integrality = np.ones(n, dtype = int)
+    ub = np.ones(n)
+    values = book.nutrients[recipee]
+
+    blocks = []
+    lower = []
+    upper = []
+    row_names = []
+
+    if formulation in ('mip', 'mip2'):
+        nutrient_names = [n for n in NUTRIENTS if n in bounds]
+        lo, up = nutrientBounds(bounds, nutrient_names)
+        blocks.append(nutrientBlock(values, nutrient_names))
+        lower.append(lo)
+        upper.append(up)
+        row_names.extend(nutrient_names)
+
+    if formulation in ('mip2', 'mip3'):
+        blocks.append(categoryBlock(book, columns))
+        lower.append(np.full(len(CATEGORIES), -INFINITY))
+        upper.append(np.ones(len(CATEGORIES)))
+        row_names.extend(CATEGORIES)
+
+    if formulation == 'mip3':
+        # sum over n of (intake[n] - nutrients[n].buy)
+        intake_names = [n for n in NUTRIENTS if n in intake]
+        cols = [NUTRIENTS.index(n) for n in intake_names]
+        c = -values[:, cols].sum(axis = 1)
+        offset = float(sum(intake[n] for n in intake_names))
+    else:
+        c = book.cost[recipee]
+        offset = 0.0
+
+    model = MatrixModel(c, sparse.vstack(blocks, format = 'csr'),
+                        np.concatenate(lower), np.concatenate(upper),
+                        ub = ub, integrality = integrality, sense = MINIMIZE,
+                        names = names, row_names = row_names,
+                        offset = offset, name = 'mip1')
+    model.build_time = time.time() - t
+
+    return model
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Batch nutrient engine. The food composition table is turned into a dense
+foods x nutrients matrix and the recipees into a sparse recipees x foods
+matrix of grams per serving, so the nutrients per serving of the whole
+catalog come out of a single sparse-dense product.
+"""
+
+import numpy as np
+from scipy import sparse
+
+from Recipee import NUTRIENTS
+from food_index import FoodIndex
+
+#******************************************************************************
+# FOOD MATRIX
+#******************************************************************************
+
+class FoodMatrix:
+    """
+    Dense representation of a food composition table.
+    """
+
+    def __init__(self, food_table):
+        """
+        Initialize the matrix.
+        Input: food table as returned by foodTable (values per 100g).
+        Rows are foods, columns follow NUTRIENTS, values are per gram.
+        Ingredient names are resolved to rows through a FoodIndex.
+        """
+
+        self.foods = list(food_table.keys())
+        self.index = dict((food, i) for i, food in enumerate(self.foods))
+        self.lookup = FoodIndex(self.index)
+        self.values = np.zeros((len(self.foods), len(NUTRIENTS)))
+
+        for i, food in enumerate(self.foods):
+            row = food_table[food][:len(NUTRIENTS)]
+            self.values[i, :len(row)] = row
+
+        self.values /= 100.0
+
+
+    def __len__(self):
+        """
+        Number of foods.
+        """
+        return len(self.foods)
+
+#******************************************************************************
+# HELPER FUNCTIONS
+#******************************************************************************
+
+def ingredientMatrix(recipees, food_index):
+    """
+    Builds a sparse recipees x foods matrix with grams per serving.
+    Input: list of recipees, dictionary (or FoodIndex) food -> column.
+    Output: csr matrix, list of (recipee name, ingredient) not found.
+    """
+
+    rows = []
+    cols = []
+    grams = []
+    missing = []
+
+    for r, recipee in enumerate(recipees):
+        for ingredient, quantity in zip(recipee.foods, recipee.quantities.tolist()):
+            j = food_index.get(ingredient)
+            if j is None:
+                missing.append((recipee.name, ingredient))
+                continue
+            rows.append(r)
+            cols.append(j)
+            grams.append(quantity/recipee.servings)
+
+    matrix = sparse.csr_matrix((grams, (rows, cols)),
+                               shape = (len(recipees), len(food_index)))
+
+    return matrix, missing
+
+
+def catalogNutrients(recipees, food_table):
+    """
+    Computes nutrients per serving of a list of recipees in one product.
+    Input: list of recipees, food table (dictionary or FoodMatrix).
+    Output: recipees x nutrients array. Each recipee's nutrient vector is
+    its row of the array (shared, not copied).
+    """
+
+    if not isinstance(food_table, FoodMatrix):
+        food_table = FoodMatrix(food_table)
+
+    grams, missing = ingredientMatrix(recipees, food_table.lookup)
+    values = np.asarray(grams.dot(food_table.values))
+
+    for recipee, row in zip(recipees, values):
+        recipee.nutrients = row
+
+    for name, ingredient in missing:
+        print("No food %s was found" % ingredient)
+
+    return values
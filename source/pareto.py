@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Cost versus nutrient deviation Pareto frontier. The two objectives are the
+menu cost (mip2) and the intake deviation sum(NUTRIENT_INTAKE[n] -
+nutrients[n].buy) (mip3). The frontier is computed with an epsilon-constraint
+sweep: minimize cost subject to deviation <= epsilon over a grid of epsilon
+values. The grid is split into contiguous blocks solved by parallel worker
+processes; inside a block epsilon grows, so every solution is a feasible MIP
+start for the next point.
+"""
+
+import copy
+import time
+import multiprocessing
+
+import numpy as np
+from scipy import sparse
+
+from Recipee import NUTRIENTS
+from profiles import NUTRIENT_INTAKE
+from model_builder import buildModel, nutrientBlock, nutrientBounds
+from solver import getBackend, MatrixModel, OPTIMAL
+
+# Worker state, set once per process by initWorker
+WORKER = {}
+
+#******************************************************************************
+# HELPER FUNCTIONS
+#******************************************************************************
+
+def frontierModel(book, bounds = None, intake = NUTRIENT_INTAKE):
+    """
+    Builds the epsilon-constraint model: minimize cost subject to the
+    category constraints, optional nutrient bounds and a last row
+    -nutrients.buy <= epsilon - offset (set per grid point).
+    Output: MatrixModel, deviation coefficients, deviation offset.
+    """
+
+    intake_model = buildModel(book, 'mip3', intake = intake)
+    deviation = intake_model.c
+    offset = intake_model.offset
+
+    blocks = [intake_model.A]
+    lower = [intake_model.row_lower]
+    upper = [intake_model.row_upper]
+
+    if bounds is not None:
+        names = [n for n in NUTRIENTS if n in bounds]
+        lo, up = nutrientBounds(bounds, names)
+        blocks.append(nutrientBlock(book.varNutrients(), names))
+        lower.append(lo)
+        upper.append(up)
+
+    blocks.append(sparse.csr_matrix(deviation.reshape(1, -1)))
+    lower.append([-np.inf])
+    upper.append([np.inf])
+
+    model = MatrixModel(book.varCost(), sparse.vstack(blocks, format = 'csr'),
+                        np.concatenate(lower), np.concatenate(upper),
+                        ub = intake_model.ub,
+                        integrality = intake_model.integrality,
+                        names = intake_model.names, name = 'frontier')
+
+    return model, deviation, offset
+
+
+def epsilonModel(model, offset, epsilon):
+    """
+    Returns a copy of the frontier model with deviation <= epsilon.
+    """
+
+    point = copy.copy(model)
+    point.row_upper = model.row_upper.copy()
+    point.row_upper[-1] = epsilon - offset
+    return point
+
+
+def nonDominated(points):
+    """
+    Keeps the points not dominated in (cost, deviation), sorted by cost.
+    """
+
+    points = sorted(points, key = lambda p: (p['cost'], p['deviation']))
+    frontier = []
+
+    for point in points:
+        if not frontier or point['deviation'] < frontier[-1]['deviation'] - 1e-9:
+            frontier.append(point)
+
+    return frontier
+
+#******************************************************************************
+# WORKERS
+#******************************************************************************
+
+def initWorker(model, deviation, offset, backend, time_limit):
+    """
+    Stores the frontier model in the worker process.
+    """
+
+    WORKER['model'] = model
+    WORKER['deviation'] = deviation
+    WORKER['offset'] = offset
+    WORKER['backend'] = getBackend(backend)
+    WORKER['time_limit'] = time_limit
+
+
+def solveBlock(block):
+    """
+    Solves a block of increasing epsilon values, each point warm-started
+    from the previous one.
+    Input: (list of epsilon values, start vector or None).
+    Output: list of point dictionaries.
+    """
+
+    epsilons, start = block
+    model = WORKER['model']
+    points = []
+
+    for epsilon in epsilons:
+        point = epsilonModel(model, WORKER['offset'], epsilon)
+        solution = WORKER['backend'].solve(point, time_limit = WORKER['time_limit'],
+                                           start = start)
+        result = {'epsilon': float(epsilon), 'status': solution.status,
+                  'solve_time': solution.solve_time}
+
+        if solution.x is not None:
+            start = solution.x
+            result['cost'] = float(np.dot(model.c, solution.x))
+            result['deviation'] = float(np.dot(WORKER['deviation'], solution.x)) + WORKER['offset']
+            result['menu'] = solution.selected(model.names)
+
+        points.append(result)
+
+    return points
+
+#******************************************************************************
+# FRONTIER
+#******************************************************************************
+
+def paretoFrontier(book, points = 50, bounds = None, intake = NUTRIENT_INTAKE,
+                   backend = 'highs', processes = None, time_limit = None):
+    """
+    Computes the cost versus intake deviation Pareto frontier.
+    Input: recipee book, number of grid points, optional nutrient bounds,
+    recommended intake, solver backend, worker processes (default one per
+    core, 1 solves in this process), time limit per point.
+    Output: dictionary with the non-dominated frontier (points with epsilon,
+    cost, deviation and menu), every grid point, and the wall time.
+    """
+
+    t = time.time()
+    model, deviation, offset = frontierModel(book, bounds, intake)
+    solver = getBackend(backend)
+
+    # Extremes: least deviation, least cost
+    least = copy.copy(model)
+    least.c = deviation
+    solution = solver.solve(least, time_limit = time_limit)
+    if solution.x is None:
+        return {'frontier': [], 'points': [], 'status': solution.status,
+                'wall_time': time.time() - t}
+    low = float(np.dot(deviation, solution.x)) + offset
+    low_start = solution.x
+
+    cheapest = epsilonModel(model, offset, np.inf)
+    solution = solver.solve(cheapest, time_limit = time_limit)
+    if solution.x is None:
+        return {'frontier': [], 'points': [], 'status': solution.status,
+                'wall_time': time.time() - t}
+    high = float(np.dot(deviation, solution.x)) + offset
+
+    epsilons = np.linspace(low, high, points) if high > low else np.array([low])
+    epsilons[0] += 1e-6*max(1.0, abs(low))
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(1, min(processes, len(epsilons)))
+    blocks = [(list(chunk), low_start)
+              for chunk in np.array_split(epsilons, processes) if len(chunk)]
+
+    args = (model, deviation, offset, backend, time_limit)
+
+    if processes == 1:
+        initWorker(*args)
+        results = [solveBlock(block) for block in blocks]
+    else:
+        pool = multiprocessing.Pool(processes, initWorker, args)
+        try:
+            results = pool.map(solveBlock, blocks)
+        finally:
+            pool.close()
+            pool.join()
+
+    grid = [point for block in results for point in block]
+    solved = [point for point in grid if point['status'] == OPTIMAL]
+
+    return {'frontier': nonDominated(solved), 'points': grid, 'status': OPTIMAL,
+            'wall_time': time.time() - t}
+
+
+def printFrontier(result):
+    """
+    Prints the frontier points and their menus.
+    """
+
+    print('\nPareto frontier: %d points (%.2fs)' % (len(result['frontier']), result['wall_time']))
+    for point in result['frontier']:
+        print('cost %(cost)10.2f  deviation %(deviation)10.2f' % point)
+        print('    ' + ', '.join(point['menu']))
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Long-lived planner. The model is built once and kept in memory; price and
+recipee changes only update the affected objective coefficients or nutrient
+rows (found through the ingredient index), and every re-solve is
+warm-started from the previous optimal menu.
+"""
+
+import time
+
+import numpy as np
+from scipy import sparse
+
+from profiles import Profile
+from model_builder import Book, buildModel
+from solver import getBackend, GurobiBackend
+from ingredient_index import IngredientIndex, modelChanges
+
+#******************************************************************************
+# PLANNER CLASS
+#******************************************************************************
+
+class Planner:
+    """
+    Class to keep a menu planning model resident between solves.
+    """
+
+    def __init__(self, recipees, cost_table, formulation = 'mip2',
+                 profile = None, backend = 'highs', food_table = None):
+        """
+        Initialize a planner.
+        Input: list of recipees, cost table, formulation, Profile (default
+        Hombres: 25-65), solver backend (default highs, as everywhere else),
+        food table (needed for composition updates). With the Gurobi backend
+        the gurobipy model stays in memory and solves are warm-started; other
+        backends keep the matrix model and every solve is cold
+        (stats['warm'] is False).
+        """
+
+        if profile is None:
+            profile = Profile('default')
+
+        self.recipees = recipees
+        self.cost_table = cost_table
+        self.formulation = formulation
+        self.profile = profile
+        self.book = Book(recipees)
+        self.index = IngredientIndex(recipees, cost_table, food_table)
+        self.model = buildModel(self.book, formulation, profile.bounds,
+                                profile.intake)
+        self.backend = getBackend(backend)
+        self.solution = None
+        self.stats = {}
+
+        self.m = self.x = None
+        if isinstance(self.backend, GurobiBackend):
+            self.m, self.x = self.backend.build(self.model)
+
+
+    def objective(self, x):
+        """
+        Returns the objective value of a menu under the current model.
+        """
+        return float(np.dot(self.model.c, x)) + self.model.offset
+
+
+    def run(self, start, time_limit = None):
+        """
+        Solves the resident model once from a start vector (None for a cold
+        solve).
+        Output: Solution.
+        """
+
+        if self.m is None:
+            return self.backend.solve(self.model, time_limit = time_limit)
+
+        from gurobipy import GRB
+        self.m.reset()
+        if time_limit is not None:
+            self.m.Params.TimeLimit = time_limit
+        if start is None:
+            self.x.Start = np.full(self.model.numVars(), GRB.UNDEFINED)
+        else:
+            self.x.Start = start
+        t = time.time()
+        self.m.optimize()
+        return self.backend.solution(self.m, self.x, 0.0, time.time() - t)
+
+
+    def solve(self, time_limit = None, warm = True, compare = False):
+        """
+        Solves the resident model, starting from the previous menu.
+        Input: time limit, whether to warm start, whether to also solve cold
+        first to measure the warm start.
+        Output: Solution. self.stats records whether the start was used (only
+        the Gurobi backend takes a MIP start), the start objective (the
+        previous menu under the current coefficients), the final objective
+        and the solve time; with compare also the cold objective and solve
+        time and the time saved by the warm start.
+        """
+
+        start = None
+        if warm and self.solution is not None and self.solution.x is not None:
+            start = self.solution.x
+
+        self.stats = {'warm': start is not None and self.m is not None,
+                      'start_objVal': None if start is None else self.objective(start)}
+
+        if compare:
+            cold = self.run(None, time_limit)
+            self.stats['cold_objVal'] = cold.objVal
+            self.stats['cold_solve_time'] = cold.solve_time
+
+        solution = self.run(start if self.stats['warm'] else None, time_limit)
+
+        self.stats['objVal'] = solution.objVal
+        self.stats['solve_time'] = solution.solve_time
+        if self.stats['start_objVal'] is not None and solution.objVal is not None:
+            self.stats['start_gap'] = self.stats['start_objVal'] - solution.objVal
+        if compare:
+            self.stats['time_saved'] = self.stats['cold_solve_time'] - solution.solve_time
+
+        self.solution = solution
+        return solution
+
+
+    def setObjective(self, columns, values):
+        """
+        Sets objective coefficients of some variables.
+        """
+
+        columns = np.asarray(columns, dtype = int)
+        self.model.c[columns] = values
+        if self.m is not None:
+            self.x[columns].Obj = np.asarray(values, dtype = float)
+
+
+    def setColumn(self, column, rows, values):
+        """
+        Sets the coefficients of a variable in some rows.
+        """
+
+        rows = np.asarray(rows, dtype = int)
+        self.setCoefficients(rows, np.full(len(rows), column), values)
+
+
+    def setCoefficients(self, rows, columns, values):
+        """
+        Sets matrix coefficients (rows[k], columns[k]) to values[k].
+        """
+
+        rows = np.asarray(rows, dtype = int)
+        columns = np.asarray(columns, dtype = int)
+        values = np.asarray(values, dtype = float)
+        if len(rows) == 0:
+            return
+
+        old = np.asarray(self.model.A[rows, columns]).ravel()
+        delta = sparse.csr_matrix((values - old, (rows, columns)),
+                                  shape = self.model.A.shape)
+        self.model.A = (self.model.A + delta).tocsr()
+        self.model.A.eliminate_zeros()
+
+        if self.m is not None:
+            constrs = self.m.getConstrs()
+            variables = self.m.getVars()
+            # Gurobi constraints of each model row (ranges give two)
+            where = {}
+            for k, row in enumerate(self.m._rows.tolist()):
+                where.setdefault(row, []).append(k)
+            for row, column, value in zip(rows.tolist(), columns.tolist(), values.tolist()):
+                for k in where.get(row, []):
+                    self.m.chgCoeff(constrs[k], variables[column], value)
+            self.m.update()
+
+
+    def applyChanges(self, changes):
+        """
+        Pushes recipee changes (from the ingredient index) into the model.
+        Input: dictionary with changed recipees and their cost and/or
+        nutrients.
+        """
+
+        rows = np.asarray(changes['recipees'], dtype = int)
+        if 'cost' in changes:
+            self.book.cost[rows] = changes['cost']
+        if 'nutrients' in changes:
+            self.book.nutrients[rows] = changes['nutrients']
+
+        coefficients = modelChanges(self.book, self.model, self.formulation,
+                                    changes, self.profile.intake)
+        columns, values = coefficients['objective']
+        if len(columns):
+            self.setObjective(columns, values)
+        self.setCoefficients(*coefficients['matrix'])
+
+
+    def updatePrices(self, prices):
+        """
+        Updates ingredient prices. Only the recipees using them are
+        recomputed.
+        Input: dictionary ingredient -> [food cost, grams].
+        Output: list of recipee names whose cost changed.
+        """
+
+        changes = self.index.updatePrices(prices)
+        self.applyChanges(changes)
+        return [self.book.recipees[r] for r in changes['recipees'].tolist()]
+
+
+    def updateComposition(self, foods):
+        """
+        Updates food composition rows. Only the recipees using them are
+        recomputed.
+        Input: dictionary food -> values per 100g.
+        Output: list of recipee names whose nutrients changed.
+        """
+
+        changes = self.index.updateComposition(foods)
+        self.applyChanges(changes)
+        return [self.book.recipees[r] for r in changes['recipees'].tolist()]
+
+
+    def updateNutrients(self, name, nutrients):
+        """
+        Overrides nutrients of a recipee. The override is kept by the
+        ingredient index, so later composition updates do not undo it.
+        Input: recipee name, dictionary nutrient -> value per serving.
+        """
+
+        r = self.book.recipees.index(name)
+        self.applyChanges(self.index.overrideNutrients(r, nutrients))
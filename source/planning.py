@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Menu planning library and command line entry point. Importing it does no
+work: the recipee book is loaded when a Catalog is created, models are built
+on first use and kept, and gurobipy is only imported when the Gurobi backend
+solves. A long-running worker keeps one Catalog warm across requests, and
+solves are served from the on-disk solution cache when the same model was
+solved before.
+
+Usage: python planning.py --formulation mip2 --path DATA --backend highs
+"""
+
+import os
+import argparse
+
+from Recipee import recipeeBuilder, PATH, CACHE, RECETARIO
+from profiles import Profile, loadProfiles
+from model_builder import Book, buildModel, FORMULATIONS
+from solver import getBackend, BACKENDS, OPTIMAL, FEASIBLE
+from instrument import span, setOutput
+from solution_cache import SolutionCache, cachedSolve, SOLUTIONS
+
+#******************************************************************************
+# CATALOG CLASS
+#******************************************************************************
+
+class Catalog:
+    """
+    Class to keep a recipee book and its models in memory.
+    """
+
+    def __init__(self, path = PATH, cache = CACHE, recetario = RECETARIO,
+                 solutions = SOLUTIONS):
+        """
+        Loads the recipee book.
+        Input: directory with the food tables and the recipee book, compiled
+        catalog file (None to parse every recipee), recipee book (directory,
+        zip or tar archive), solution cache directory inside path (None to
+        always solve).
+        """
+
+        with span('recipeeBuilder') as stage:
+            self.recipees, self.food_table, self.cost_table = recipeeBuilder(
+                path, cache, recetario)
+            stage['counts']['recipees'] = len(self.recipees)
+
+        with span('recipeeBook') as stage:
+            self.book = Book(self.recipees)
+            stage['counts']['vars'] = self.book.numVars()
+
+        self.models = {}
+        self.solutions = None
+        if solutions is not None:
+            self.solutions = SolutionCache(os.path.join(path, solutions))
+
+
+    def model(self, formulation = 'mip2', profile = None, columns = None):
+        """
+        Returns the model of a formulation. Models with the default bounds
+        and intake are built once and kept.
+        Input: formulation (lp, mip, mip2, mip3), Profile (default Hombres:
+        25-65), recipee-slot variables to keep (e.g. from pruneVariables).
+        """
+
+        if profile is not None or columns is not None:
+            profile = profile or Profile('default')
+            return buildModel(self.book, formulation, profile.bounds,
+                              profile.intake, columns)
+
+        if formulation not in self.models:
+            with span('constraints', formulation = formulation) as stage:
+                self.models[formulation] = buildModel(self.book, formulation)
+                stage['counts']['constrs'] = self.models[formulation].numConstrs()
+
+        return self.models[formulation]
+
+
+    def solve(self, formulation = 'mip2', profile = None, backend = 'highs',
+              time_limit = None, verbose = False, columns = None):
+        """
+        Solves a formulation, through the solution cache if there is one.
+        Output: (model, Solution); solution.cached tells whether it came
+        from the cache.
+        """
+
+        model = self.model(formulation, profile, columns)
+        with span('optimize', backend = str(backend)) as stage:
+            if self.solutions is None:
+                solution = getBackend(backend).solve(model, time_limit = time_limit,
+                                                     verbose = verbose)
+            else:
+                solution = cachedSolve(model, self.solutions, backend,
+                                       time_limit = time_limit, verbose = verbose)
+            stage['counts']['cached'] = int(solution.cached)
+
+        return model, solution
+
+#******************************************************************************
+# HELPER FUNCTIONS
+#******************************************************************************
+
+def printMenu(model, solution, formulation = 'mip2'):
+    """
+    Prints the objective and the selected recipees of a solution.
+    """
+
+    print('\n%s%s' % (solution, ' (cached)' if solution.cached else ''))
+
+    if solution.x is None:
+        print('No solution')
+        return
+
+    label = 'Deviation' if formulation == 'mip3' else 'Cost'
+    print('\n%s: %g' % (label, solution.objVal))
+    print('\nBuy:')
+    for name, value in zip(model.names, solution.x):
+        if value > 0.0001:
+            print('%s %g' % (name, value))
+
+
+def main(argv = None):
+    """
+    Command line entry point.
+    """
+
+    parser = argparse.ArgumentParser(description = 'Menu planning')
+    parser.add_argument('--formulation', '-f', choices = FORMULATIONS, default = 'mip2')
+    parser.add_argument('--path', default = PATH)
+    parser.add_argument('--recetario', default = RECETARIO)
+    parser.add_argument('--no-cache', action = 'store_true',
+                        help = 'parse every recipee instead of the compiled catalog')
+    parser.add_argument('--solution-cache', default = SOLUTIONS,
+                        help = 'solution cache directory (inside --path)')
+    parser.add_argument('--no-solution-cache', action = 'store_true',
+                        help = 'always solve instead of reusing cached solutions')
+    parser.add_argument('--backend', choices = sorted(BACKENDS), default = 'highs')
+    parser.add_argument('--time-limit', type = float, default = None)
+    parser.add_argument('--profiles', help = 'csv file of nutrition profiles')
+    parser.add_argument('--profile', help = 'profile name in --profiles')
+    parser.add_argument('--export', help = 'write the model as MPS (.mps.gz)')
+    parser.add_argument('--prune', action = 'store_true',
+                        help = 'remove duplicate and dominated recipee-slots '
+                               'before building the model (mip2, mip3)')
+    parser.add_argument('--column-generation', action = 'store_true',
+                        help = 'price recipee-slots from LP duals instead of '
+                               'building every variable (mip, mip2, mip3)')
+    parser.add_argument('--spans', help = 'write stage spans as json lines')
+    parser.add_argument('--verbose', action = 'store_true')
+    args = parser.parse_args(argv)
+
+    if args.spans:
+        setOutput(args.spans)
+
+    profile = None
+    if args.profile:
+        profiles = loadProfiles(args.profiles) if args.profiles else {}
+        if args.profile not in profiles:
+            parser.error('unknown profile %s' % args.profile)
+        profile = profiles[args.profile]
+
+    if args.column_generation and args.formulation == 'lp':
+        parser.error('column generation needs a mip formulation')
+    if args.prune and args.formulation not in ('mip2', 'mip3'):
+        parser.error('pruning needs the mip2 or mip3 formulation')
+
+    catalog = Catalog(args.path, None if args.no_cache else CACHE, args.recetario,
+                      None if args.no_solution_cache else args.solution_cache)
+
+    if args.column_generation:
+        from column_generation import columnGeneration, printColumnGeneration
+        if profile is None:
+            profile = Profile('default')
+        with span('columnGeneration', formulation = args.formulation):
+            model, solution, report = columnGeneration(
+                catalog.book, args.formulation, profile.bounds, profile.intake,
+                backend = args.backend, time_limit = args.time_limit,
+                verbose = args.verbose)
+        printColumnGeneration(report)
+    else:
+        columns = None
+        if args.prune:
+            from pruning import pruneVariables, printPruning
+            bounds = profile or Profile('default')
+            with span('pruneVariables', formulation = args.formulation) as stage:
+                columns, report = pruneVariables(catalog.book, args.formulation,
+                                                 bounds.bounds, bounds.intake)
+                stage['counts']['pruned'] = len(report)
+            printPruning(columns, report)
+        model, solution = catalog.solve(args.formulation, profile, args.backend,
+                                        args.time_limit, args.verbose, columns)
+
+    if args.export:
+        from registry import exportModel
+        registry = None if args.formulation == 'lp' or args.column_generation \
+            or args.prune else catalog.book.registry
+        exportModel(model, args.export, registry, background = False)
+
+    printMenu(model, solution, args.formulation)
+
+    return 0 if solution.status in (OPTIMAL, FEASIBLE) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Procurement. A planned menu (or a multi-day plan) and the number of diners
+per meal are rolled up into what the kitchen must buy. Servings of every
+recipee are
+
+    servings = bincount(recipee, (plan x diners[:, meal]).sum(days))
+
+and the grams of every ingredient are one sparse product with the
+recipees x ingredients matrix of grams per serving. Costs come from the cost
+table's [cost, grams] packs: whole packs to buy and their cost.
+"""
+
+import csv
+
+import numpy as np
+from scipy import sparse
+
+from model_builder import MEALS, CATEGORIES
+from food_index import FoodIndex
+
+#******************************************************************************
+# PROCUREMENT CLASS
+#******************************************************************************
+
+class Procurement:
+    """
+    Class to compute purchase lists of a recipee book. The ingredient matrix
+    and pack data are built once and reused for every plan.
+    """
+
+    def __init__(self, book, recipees, cost_table):
+        """
+        Initialize the ingredient matrix.
+        Input: recipee book (Book), the recipees it was built from, cost
+        table (dictionary ingredient -> [cost, grams] or FoodIndex).
+        """
+
+        if not isinstance(cost_table, FoodIndex):
+            cost_table = FoodIndex(cost_table)
+
+        self.book = book
+        self.meal = np.array([MEALS.index(key[0]) for key in CATEGORIES])[book.slot]
+
+        # One column per ingredient, resolved to its cost table entry if any
+        self.ingredients = []
+        column = {}
+        rows = []
+        cols = []
+        grams = []
+
+        for r, recipee in enumerate(recipees):
+            for ingredient, quantity in recipee.ingredients.items():
+                key = cost_table.resolve(ingredient) or ingredient
+                if key not in column:
+                    column[key] = len(self.ingredients)
+                    self.ingredients.append(key)
+                rows.append(r)
+                cols.append(column[key])
+                grams.append(quantity/recipee.servings)
+
+        self.grams = sparse.csr_matrix((grams, (rows, cols)),
+                                       shape = (len(recipees), len(self.ingredients)))
+
+        self.pack_cost = np.full(len(self.ingredients), np.nan)
+        self.pack_grams = np.full(len(self.ingredients), np.nan)
+        for j, key in enumerate(self.ingredients):
+            if key in cost_table.table:
+                self.pack_cost[j], self.pack_grams[j] = cost_table.table[key][:2]
+
+
+    def planMatrix(self, plan):
+        """
+        Returns a sparse days x variables matrix of a plan.
+        Input: list of recipee-slot names or variable indices (one day),
+        vector of variable values or boolean mask (one per variable),
+        dictionary day -> list (several days), or a HorizonPlan.
+        Output: csr matrix, list of days.
+        """
+
+        if hasattr(plan, 'selected'):
+            plan = plan.selected
+
+        if isinstance(plan, dict):
+            days = sorted(plan)
+            menus = [plan[day] for day in days]
+        else:
+            days = [0]
+            menus = [plan]
+
+        n = self.book.numVars()
+        index = None
+        rows = []
+        cols = []
+        values = []
+
+        for d, menu in enumerate(menus):
+            menu = list(menu) if not isinstance(menu, np.ndarray) else menu
+            if isinstance(menu, np.ndarray) and menu.dtype.kind in 'bf':
+                # Variable values, e.g. Solution.x, or a mask (x > 0.5)
+                menu = menu.astype(float)
+                if len(menu) != n:
+                    raise ValueError("Plan vector has %d values, expected %d variables"
+                                     % (len(menu), n))
+                selected = np.flatnonzero(menu > 0.0001)
+                rows.extend([d]*len(selected))
+                cols.extend(selected.tolist())
+                values.extend(menu[selected].tolist())
+                continue
+            for item in menu:
+                if isinstance(item, str):
+                    if index is None:
+                        index = dict((name, i) for i, name in enumerate(self.book.names))
+                    item = index[item]
+                rows.append(d)
+                cols.append(int(item))
+                values.append(1.0)
+
+        matrix = sparse.csr_matrix((values, (rows, cols)), shape = (len(days), n))
+        return matrix, days
+
+
+    def dinerMatrix(self, diners, days):
+        """
+        Returns a days x meals array of diners.
+        Input: number of diners (every meal), dictionary meal -> diners,
+        dictionary day -> (number or dictionary meal -> diners), or a
+        days x meals array.
+        """
+
+        def row(value):
+            if isinstance(value, dict):
+                return [value.get(meal, 0) for meal in MEALS]
+            return [value]*len(MEALS)
+
+        if isinstance(diners, dict) and not set(diners) <= set(MEALS):
+            return np.array([row(diners.get(day, 0)) for day in days], dtype = float)
+        if isinstance(diners, (dict, int, float)):
+            return np.array([row(diners)]*len(days), dtype = float)
+
+        return np.asarray(diners, dtype = float).reshape(len(days), len(MEALS))
+
+
+    def servings(self, plan, diners):
+        """
+        Returns the servings of every recipee.
+        """
+
+        matrix, days = self.planMatrix(plan)
+        counts = self.dinerMatrix(diners, days)
+
+        # Diners of each variable's meal on each day
+        per_var = np.asarray(matrix.multiply(counts[:, self.meal]).sum(axis = 0)).ravel()
+        return np.bincount(self.book.recipee, per_var, minlength = self.grams.shape[0])
+
+
+    def purchase(self, plan, diners):
+        """
+        Computes the purchase list of a plan.
+        Input: plan (see planMatrix), diners (see dinerMatrix).
+        Output: dictionary with ingredient names, grams, packs to buy, pack
+        grams, cost of the packs and cost of the grams used, in ingredient
+        order; ingredients without a cost have nan pack data.
+        """
+
+        grams = self.grams.T.dot(self.servings(plan, diners))
+        used = grams > 0
+
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            packs = np.ceil(grams/self.pack_grams - 1e-9)
+            cost = packs*self.pack_cost
+            used_cost = grams*self.pack_cost/self.pack_grams
+
+        return {'ingredients': [self.ingredients[j] for j in np.flatnonzero(used)],
+                'grams': grams[used],
+                'packs': packs[used],
+                'pack_grams': self.pack_grams[used],
+                'cost': cost[used],
+                'used_cost': used_cost[used]}
+
+#******************************************************************************
+# HELPER FUNCTIONS
+#******************************************************************************
+
+def totalCost(purchase):
+    """
+    Returns the cost of the packs and of the grams used (ingredients with a
+    cost only).
+    """
+    return float(np.nansum(purchase['cost'])), float(np.nansum(purchase['used_cost']))
+
+
+def writePurchaseList(purchase, filename):
+    """
+    Writes a purchase list as csv.
+    """
+
+    with open(filename, 'w', encoding = 'utf-8', newline = '') as table:
+        writer = csv.writer(table)
+        writer.writerow(['ingrediente', 'gramos', 'paquetes', 'gramos_paquete',
+                         'costo', 'costo_usado'])
+        for i, ingredient in enumerate(purchase['ingredients']):
+            writer.writerow([ingredient] + ['' if np.isnan(purchase[key][i])
+                                            else round(float(purchase[key][i]), 2)
+                                            for key in ('grams', 'packs', 'pack_grams',
+                                                        'cost', 'used_cost')])
+
+
+def printPurchaseList(purchase):
+    """
+    Prints a purchase list.
+    """
+
+    for i, ingredient in enumerate(purchase['ingredients']):
+        if np.isnan(purchase['packs'][i]):
+            print('%s %.1fg (no cost)' % (ingredient, purchase['grams'][i]))
+        else:
+            print('%s %.1fg, %d x %gg: $%.2f' % (ingredient, purchase['grams'][i],
+                                                purchase['packs'][i],
+                                                purchase['pack_grams'][i],
+                                                purchase['cost'][i]))
+    print('\nTotal: $%.2f (used $%.2f)' % totalCost(purchase))
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Nutrition profiles: lower and upper bounds on daily nutrients (cost models)
+and recommended nutrient intake (intake model).
+"""
+
+import csv
+
+from Recipee import NUTRIENTS
+
+INFINITY = float('inf')
+
+# Nutrition guidelines, based on
+# http://www.nutripac.com.mx/software/rec-mex.pdf
+# Hombres: 25-65
+
+NUTRITION_BOUNDS = {
+             'agua': [0, INFINITY],
+             'energia': [1800, 2700],
+             'proteina': [46, 56],
+             'grasa_total': [28, 43],
+             'carbohidratos': [0, INFINITY],
+             'fibra_dietetica': [18, 24],
+             'ceniza': [0, INFINITY],
+             'calcio': [800, INFINITY],
+             'fosforo': [800, INFINITY],
+             'hierro': [15, INFINITY],
+             'tiamina': [1.5, INFINITY],
+             'riboflavina': [1.7, INFINITY],
+             'niacina': [20, INFINITY],
+             'vitamina_c': [60, INFINITY],
+             'vitamina_a_rae': [1000, INFINITY],
+             'ac_graso_mono': [0, INFINITY],
+             'ac_graso_poli': [0, INFINITY],
+             'ac_graso_sat':[0, INFINITY],
+             'colesterol': [0, 300],
+             'potasio': [2000, INFINITY],
+             'sodio': [0, 2500],
+             'zinc': [15, INFINITY],
+             'magnesio': [350, INFINITY],
+             'vitamina_b6': [2, INFINITY],
+             'vitamina_b12': [2, INFINITY],
+             'acido_folico': [200, INFINITY],
+             'folato': [0, INFINITY]}
+
+# Recommended nutrient intake
+NUTRIENT_INTAKE = {
+             'agua': 3200.0,
+             'energia': 2250.0,
+             'proteina': 53.0,
+             'grasa_total': 60.0,
+             'carbohidratos': 300.0,
+             'fibra_dietetica': 31.0,
+             'calcio': 800.0,
+             'fosforo': 800.0,
+             'hierro': 15.0,
+             'tiamina': 1.5,
+             'riboflavina': 1.7,
+             'niacina': 20.0,
+             'vitamina_c': 60.0,
+             'vitamina_a_rae': 1000.0,
+             'ac_graso_mono': 20,
+             'ac_graso_poli': 10,
+             'ac_graso_sat':10,
+             'colesterol': 300.0,
+             'potasio': 2000.0,
+             'sodio': 2000.0,
+             'zinc': 15.0,
+             'magnesio': 350.0,
+             'vitamina_b6': 2.0,
+             'vitamina_b12': 2.0,
+             'acido_folico': 200.0,
+             'folato': 400}
+
+#******************************************************************************
+# PROFILE CLASS
+#******************************************************************************
+
+class Profile:
+    """
+    Class to contain a diner nutrition profile.
+    """
+
+    def __init__(self, name, bounds = None, intake = None):
+        """
+        Initialize a profile.
+        Input: name, dictionary nutrient -> [min, max], dictionary
+        nutrient -> recommended intake.
+        """
+
+        self.name = name
+        self.bounds = dict(NUTRITION_BOUNDS if bounds is None else bounds)
+        self.intake = dict(NUTRIENT_INTAKE if intake is None else intake)
+
+
+    def __str__(self):
+        """
+        As string.
+        """
+
+        profile = "\n" + self.name + "\n"
+
+        for nutrient in self.bounds:
+            profile += "\n" + nutrient + ": " + str(self.bounds[nutrient])
+
+        return profile + "\n"
+
+#******************************************************************************
+# HELPER FUNCTIONS
+#******************************************************************************
+
+def convertBound(string, default):
+    """
+    Converts a string into a float bound, empty strings take the default.
+    """
+    if string is None or string.strip() == '':
+        return default
+    return float(string)
+
+
+def loadProfiles(filename):
+    """
+    Reads nutrition profiles from a csv file with header
+    profile,nutrient,min,max,intake (one row per profile and nutrient).
+    Empty min (max) means 0 (no upper bound), empty intake means the nutrient
+    is not part of the intake objective.
+    Output: dictionary name -> Profile, in file order. Nutrients missing
+    from NUTRIENTS (e.g. a typo) raise ValueError, they would be dropped from
+    the model without notice.
+    """
+
+    profiles = {}
+
+    with open(filename) as csv_file:
+        csv_reader = csv.DictReader(csv_file, delimiter = ",")
+
+        for row in csv_reader:
+            name = row['profile']
+            if name not in profiles:
+                profiles[name] = Profile(name, {}, {})
+            profile = profiles[name]
+            nutrient = row['nutrient']
+            if nutrient not in NUTRIENTS:
+                raise ValueError("Unknown nutrient %s in profile %s (%s line %d)"
+                                 % (nutrient, name, filename, csv_reader.line_num))
+            profile.bounds[nutrient] = [convertBound(row.get('min'), 0),
+                                        convertBound(row.get('max'), INFINITY)]
+            intake = convertBound(row.get('intake'), None)
+            if intake is not None:
+                profile.intake[nutrient] = intake
+
+    return profiles
+
+
+def defaultProfiles():
+    """
+    Returns the hard-coded profile (Hombres: 25-65) as a dictionary.
+    """
+    return {'hombres_25_65': Profile('hombres_25_65')}
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Dominance and duplicate pruning of recipee-slot variables (mip2, mip3). At
+most one recipee is served per category, so a recipee-slot can be swapped
+for another of the same slot without touching the rest of the menu. If the
+other one is no worse on the objective and on every bound that can bind
+(more of a nutrient with only a lower bound, less of one with only an upper
+bound, the same amount of one bounded on both sides), the swap keeps the
+menu feasible and no more expensive, so the variable can be removed before
+the model is built. Variables equal on all of them are duplicates; one is
+kept.
+"""
+
+import numpy as np
+
+from Recipee import NUTRIENTS
+from profiles import NUTRITION_BOUNDS, NUTRIENT_INTAKE
+from model_builder import CATEGORIES
+from screening import reachableTotals
+
+# Maximum size of the pairwise comparison blocks (variables x variables)
+BLOCK = 4000000
+
+#******************************************************************************
+# HELPER FUNCTIONS
+#******************************************************************************
+
+def criteria(book, formulation = 'mip2', bounds = NUTRITION_BOUNDS,
+             intake = NUTRIENT_INTAKE):
+    """
+    Returns the variables x criteria matrix, larger is better in every
+    column: minus the objective, then the nutrients whose bounds can bind
+    (signed by direction, twice for two-sided bounds).
+    Input: recipee book, formulation (mip2, mip3), nutrient bounds (mip2),
+    recommended nutrient intake (mip3).
+    Output: matrix, list of criteria names.
+    """
+
+    if formulation == 'mip3':
+        cols = [NUTRIENTS.index(n) for n in NUTRIENTS if n in intake]
+        objective = -book.nutrients[:, cols].sum(axis = 1)
+        return -objective[book.recipee][:, None], ['objective']
+
+    if formulation != 'mip2':
+        raise ValueError("Pruning needs the category rows of mip2 or mip3, not %s" % formulation)
+
+    values = book.varNutrients()
+    columns = [-book.varCost()]
+    names = ['cost']
+
+    # Bounds outside the reachable totals never bind
+    lowest, highest = reachableTotals(book, formulation)
+    for i, nutrient in enumerate(NUTRIENTS):
+        if nutrient not in bounds:
+            continue
+        lower, upper = bounds[nutrient]
+        if lower > lowest[i]:
+            columns.append(values[:, i])
+            names.append(nutrient + '>=')
+        if upper < highest[i]:
+            columns.append(-values[:, i])
+            names.append(nutrient + '<=')
+
+    return np.column_stack(columns), names
+
+
+def dominators(F, block = BLOCK):
+    """
+    Returns, for every row of F, the index of a row that dominates it (at
+    least as large in every column, larger in one), or -1. Rows must be
+    unique.
+    """
+
+    m, d = F.shape
+    result = np.full(m, -1)
+    if m < 2 or d == 0:
+        return result
+
+    # A dominating row comes first in decreasing lexicographic order, so
+    # every row is only compared with the rows before it, and the pairs
+    # still standing are narrowed one column at a time
+    order = np.lexsort(-F.T[::-1])
+    G = F[order]
+    step = max(1, block//m)
+
+    for start in range(0, m, step):
+        stop = min(m, start + step)
+        chunk = G[start:stop]
+        before = np.arange(stop)[None, :] < np.arange(start, stop)[:, None]
+        a, b = np.nonzero(before & (G[None, :stop, d - 1] >= chunk[:, None, d - 1]))
+        for col in range(1, d - 1):
+            keep = G[b, col] >= chunk[a, col]
+            a = a[keep]
+            b = b[keep]
+        result[order[start + a]] = order[b]
+
+    return result
+
+#******************************************************************************
+# PRUNING
+#******************************************************************************
+
+def pruneVariables(book, formulation = 'mip2', bounds = NUTRITION_BOUNDS,
+                   intake = NUTRIENT_INTAKE):
+    """
+    Removes duplicate and dominated recipee-slot variables, slot by slot.
+    Input: recipee book, formulation (mip2, mip3), nutrient bounds (mip2),
+    recommended nutrient intake (mip3).
+    Output: sorted ids of the variables kept (see buildModel columns), list
+    of dictionaries with the pruned variable, its recipee and category, the
+    reason (duplicate or dominated) and the kept variable that replaces it.
+    """
+
+    F, names = criteria(book, formulation, bounds, intake)
+    keeper = np.arange(book.numVars())
+    reasons = {}
+
+    for s in range(len(CATEGORIES)):
+        ids = np.flatnonzero(book.slot == s)
+        if len(ids) < 2:
+            continue
+
+        # Duplicates: the first variable of every distinct row is kept
+        unique, first, inverse = np.unique(F[ids], axis = 0, return_index = True,
+                                           return_inverse = True)
+        inverse = inverse.ravel()
+        for j, u in zip(ids.tolist(), inverse.tolist()):
+            if ids[first[u]] != j:
+                keeper[j] = ids[first[u]]
+                reasons[j] = 'duplicate'
+
+        # Dominance among distinct rows; follow the chain to a kept row
+        better = dominators(unique)
+        for u in range(len(unique)):
+            k = u
+            while better[k] >= 0:
+                k = better[k]
+            if k != u:
+                keeper[ids[first[u]]] = ids[first[k]]
+                reasons[ids[first[u]]] = 'dominated'
+
+    # Duplicates of a dominated row go to its keeper
+    keeper = keeper[keeper]
+
+    kept = np.flatnonzero(keeper == np.arange(book.numVars()))
+    report = []
+    for j in sorted(reasons):
+        recipee, category = book.registry.pair(j)
+        report.append({'variable': book.registry.name(j), 'recipee': recipee,
+                       'category': category, 'reason': reasons[j],
+                       'by': book.registry.name(keeper[j])})
+
+    return kept, report
+
+
+def printPruning(kept, report):
+    """
+    Prints the pruned variables.
+    """
+
+    print('\nPruning: %d variables kept, %d removed' % (len(kept), len(report)))
+    for row in report:
+        print('%(variable)s: %(reason)s by %(by)s' % row)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Streaming recipee ingestion. Recipees are read one at a time from a
+directory, a zip archive or a tar archive (optionally compressed) without
+extracting it, decoded with the kitchen system's encoding, and handed to the
+nutrient engine in chunks so memory stays bounded.
+"""
+
+import io
+import os
+import tarfile
+import zipfile
+
+from Recipee import *
+from nutrient_matrix import FoodMatrix, catalogNutrients
+from food_index import FoodIndex
+
+EXTENSION = '.csv'
+
+#******************************************************************************
+# HELPER FUNCTIONS
+#******************************************************************************
+
+def decode(data, encoding = ENCODING):
+    """
+    Decodes the bytes of a csv file. With encoding None, utf-8 is tried
+    first and latin-1 is used as fallback.
+    """
+
+    if encoding is not None:
+        return data.decode(encoding)
+
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return data.decode('latin-1')
+
+
+def recipeeName(member):
+    """
+    Returns recipee name of an archive member (basename without extension).
+    """
+    return os.path.basename(member)[:-len(EXTENSION)]
+
+
+def zipName(info):
+    """
+    Returns the file name of a zip member. Names without the utf-8 flag were
+    decoded as cp437 by zipfile; they are re-decoded.
+    """
+
+    if info.flag_bits & 0x800:
+        return info.filename
+    return decode(info.filename.encode('cp437'), None)
+
+#******************************************************************************
+# STREAMS
+#******************************************************************************
+
+def directoryRecords(path, encoding = ENCODING):
+    """
+    Yields recipee records from the csv files in a directory.
+    """
+
+    for filename in sorted(os.listdir(path)):
+        if filename.lower().endswith(EXTENSION):
+            with open(os.path.join(path, filename), 'rb') as data:
+                text = decode(data.read(), encoding)
+            yield parseRecipee(recipeeName(filename), io.StringIO(text, newline = ''))
+
+
+def zipRecords(filename, encoding = ENCODING):
+    """
+    Yields recipee records from the csv members of a zip archive.
+    """
+
+    with zipfile.ZipFile(filename) as archive:
+        for info in archive.infolist():
+            name = zipName(info)
+            if info.is_dir() or not name.lower().endswith(EXTENSION):
+                continue
+            text = decode(archive.read(info), encoding)
+            yield parseRecipee(recipeeName(name), io.StringIO(text, newline = ''))
+
+
+def tarRecords(filename, encoding = ENCODING):
+    """
+    Yields recipee records from the csv members of a tar archive. The archive
+    is read sequentially (stream mode), any compression is detected.
+    """
+
+    with tarfile.open(filename, 'r|*') as archive:
+        for member in archive:
+            if not member.isfile() or not member.name.lower().endswith(EXTENSION):
+                continue
+            text = decode(archive.extractfile(member).read(), encoding)
+            yield parseRecipee(recipeeName(member.name), io.StringIO(text, newline = ''))
+
+
+def streamRecords(source, encoding = ENCODING):
+    """
+    Yields recipee records (as returned by readRecipee) one at a time.
+    Input: directory, zip archive or tar archive; encoding of the csv files
+    (None to detect utf-8, falling back to latin-1).
+    """
+
+    if os.path.isdir(source):
+        return directoryRecords(source, encoding)
+    if zipfile.is_zipfile(source):
+        return zipRecords(source, encoding)
+    if tarfile.is_tarfile(source):
+        return tarRecords(source, encoding)
+
+    raise ValueError("%s is not a directory, zip or tar archive" % source)
+
+
+def recipeeChunks(source, food_table, cost_table, size = 1000,
+                  encoding = ENCODING):
+    """
+    Yields lists of at most size recipees with nutrients and cost computed.
+    Input: directory or archive, food table, cost table, chunk size, encoding.
+    """
+
+    if not isinstance(food_table, FoodMatrix):
+        food_table = FoodMatrix(food_table)
+    if not isinstance(cost_table, FoodIndex):
+        cost_table = FoodIndex(cost_table)
+
+    chunk = []
+
+    for record in streamRecords(source, encoding):
+        chunk.append(Recipee(record, food_table, cost_table, False))
+        if len(chunk) == size:
+            catalogNutrients(chunk, food_table)
+            yield chunk
+            chunk = []
+
+    if chunk:
+        catalogNutrients(chunk, food_table)
+        yield chunk
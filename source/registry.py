@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Integer-ID registry of recipee-slot pairs and compact model export. Every
+recipee-slot variable gets a dense integer id (its column in the model); the
+names ('recipee_slot') are a side table generated only when asked for. Models
+are exported as (gzip compressed) MPS with id names x<j> and r<i>, which
+Gurobi and HiGHS read back, optionally in a background thread so the solve
+is not blocked by the write.
+"""
+
+import csv
+import gzip
+import threading
+
+import numpy as np
+from scipy import sparse
+
+from solver import MAXIMIZE
+from instrument import span
+
+#******************************************************************************
+# REGISTRY
+#******************************************************************************
+
+class Registry:
+    """
+    Dense integer ids of recipee-slot pairs. Id j is the pair
+    (recipee[j], slot[j]); names are built lazily.
+    """
+
+    def __init__(self, recipees, recipee, slot, categories):
+        """
+        Initialize a registry.
+        Input: recipee names, recipee index and category index of every
+        pair, category names.
+        """
+
+        self.recipees = recipees
+        self.recipee = np.asarray(recipee, dtype = int)
+        self.slot = np.asarray(slot, dtype = int)
+        self.categories = categories
+        self._names = None
+        self._index = None
+
+
+    def __len__(self):
+        """
+        Returns number of pairs.
+        """
+        return len(self.recipee)
+
+
+    def name(self, i):
+        """
+        Returns the name of id i.
+        """
+        return self.recipees[self.recipee[i]] + '_' + self.categories[self.slot[i]]
+
+
+    def names(self):
+        """
+        Returns the list of names of every id (built once).
+        """
+
+        if self._names is None:
+            recipees = self.recipees
+            categories = self.categories
+            self._names = [recipees[r] + '_' + categories[s] for r, s in
+                           zip(self.recipee.tolist(), self.slot.tolist())]
+        return self._names
+
+
+    def id(self, recipee, category):
+        """
+        Returns the id of a recipee-slot pair, None if missing.
+        """
+
+        if self._index is None:
+            self._index = dict(((self.recipees[r], s), i) for i, (r, s) in
+                               enumerate(zip(self.recipee.tolist(), self.slot.tolist())))
+        if category not in self.categories:
+            return None
+        return self._index.get((recipee, self.categories.index(category)))
+
+
+    def pair(self, i):
+        """
+        Returns (recipee name, category) of id i.
+        """
+        return self.recipees[self.recipee[i]], self.categories[self.slot[i]]
+
+
+    def writeTable(self, filename):
+        """
+        Writes the side table id,recipee,category as csv.
+        """
+
+        with open(filename, 'w', encoding = 'utf-8', newline = '') as table:
+            writer = csv.writer(table)
+            writer.writerow(['id', 'recipee', 'category'])
+            for i, (r, s) in enumerate(zip(self.recipee.tolist(), self.slot.tolist())):
+                writer.writerow([i, self.recipees[r], self.categories[s]])
+
+#******************************************************************************
+# MPS EXPORT
+#******************************************************************************
+
+def number(value):
+    """
+    Formats a number for MPS.
+    """
+    return '%.17g' % value
+
+
+def mpsLines(model):
+    """
+    Returns the lines of a free MPS file of a matrix model, with variables
+    named x<j> and rows r<i>.
+    """
+
+    lines = ['NAME %s' % model.name]
+    if model.sense == MAXIMIZE:
+        lines.extend(['OBJSENSE', '    MAX'])
+
+    lower, upper = model.row_lower, model.row_upper
+    equal = lower == upper
+    kinds = np.where(equal, 'E', np.where(np.isfinite(lower), 'G',
+                                          np.where(np.isfinite(upper), 'L', 'N')))
+
+    lines.append('ROWS')
+    lines.append(' N obj')
+    lines.extend(' %s r%d' % (kind, i) for i, kind in enumerate(kinds.tolist()))
+
+    lines.append('COLUMNS')
+    A = sparse.csc_matrix(model.A)
+    integer = False
+    for j in range(model.numVars()):
+        if (model.integrality[j] > 0) != integer:
+            integer = not integer
+            lines.append("    MARKER 'MARKER' '%s'" % ('INTORG' if integer else 'INTEND'))
+        lines.append('    x%d obj %s' % (j, number(model.c[j])))
+        start, end = A.indptr[j], A.indptr[j + 1]
+        lines.extend('    x%d r%d %s' % (j, i, number(v)) for i, v in
+                     zip(A.indices[start:end].tolist(), A.data[start:end].tolist()))
+    if integer:
+        lines.append("    MARKER 'MARKER' 'INTEND'")
+
+    rhs = np.where(kinds == 'L', upper, lower)
+    lines.append('RHS')
+    if model.offset:
+        lines.append('    rhs obj %s' % number(-model.offset))
+    lines.extend('    rhs r%d %s' % (i, number(rhs[i])) for i in
+                 np.flatnonzero((kinds != 'N') & (rhs != 0)).tolist())
+
+    ranged = (kinds == 'G') & np.isfinite(upper)
+    if ranged.any():
+        lines.append('RANGES')
+        lines.extend('    rng r%d %s' % (i, number(upper[i] - lower[i]))
+                     for i in np.flatnonzero(ranged).tolist())
+
+    lines.append('BOUNDS')
+    for j in range(model.numVars()):
+        lb, ub = model.lb[j], model.ub[j]
+        if model.integrality[j] > 0 and lb == 0 and ub == 1:
+            lines.append(' BV bnd x%d' % j)
+            continue
+        if lb == ub:
+            lines.append(' FX bnd x%d %s' % (j, number(lb)))
+            continue
+        if np.isinf(lb):
+            lines.append(' MI bnd x%d' % j)
+        elif lb != 0:
+            lines.append(' LO bnd x%d %s' % (j, number(lb)))
+        if np.isfinite(ub):
+            lines.append(' UP bnd x%d %s' % (j, number(ub)))
+        elif model.integrality[j] > 0:
+            lines.append(' PL bnd x%d' % j)
+
+    lines.append('ENDATA')
+    return lines
+
+
+def writeMPS(model, filename):
+    """
+    Writes a matrix model as MPS (gzip compressed if filename ends in .gz).
+    """
+
+    opener = gzip.open if filename.endswith('.gz') else open
+    with opener(filename, 'wt') as output:
+        output.write('\n'.join(mpsLines(model)) + '\n')
+
+
+def writeNames(model, filename, registry = None):
+    """
+    Writes the side table of variable ids: the registry table if given,
+    otherwise id,name from the model.
+    """
+
+    if registry is not None:
+        registry.writeTable(filename)
+        return
+
+    with open(filename, 'w', encoding = 'utf-8', newline = '') as table:
+        writer = csv.writer(table)
+        writer.writerow(['id', 'name'])
+        for i, name in enumerate(model.names or []):
+            writer.writerow([i, name])
+
+
+def exportModel(model, filename, registry = None, background = True):
+    """
+    Exports a matrix model as MPS (filename, e.g. menu.mps.gz) and the id
+    side table (filename + '.names.csv').
+    Input: matrix model, file name, registry, whether to write in a
+    background thread.
+    Output: the started thread (join it before reading the files), or None.
+    The write span is recorded by the thread that writes, so it measures
+    the export and not the thread start.
+    """
+
+    def write():
+        with span('write', {'vars': model.numVars(), 'constrs': model.numConstrs()}):
+            writeMPS(model, filename)
+            writeNames(model, filename + '.names.csv', registry)
+
+    if not background:
+        write()
+        return None
+
+    thread = threading.Thread(target = write, name = 'export ' + filename)
+    thread.start()
+    return thread
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Pre-solve feasibility screening of nutrient bounds. Under the mip2 structure
+(at most one recipee per category) the smallest and largest total of each
+nutrient are the sums over categories of the per-category minimum and
+maximum (an empty category counts as 0). Bounds outside that range cannot be
+met; they are reported with the gap, without calling the MIP solver. An LP
+relaxation check catches bounds that are reachable one at a time but not
+together.
+"""
+
+import copy
+
+import numpy as np
+
+from Recipee import NUTRIENTS
+from profiles import NUTRITION_BOUNDS
+from model_builder import buildModel
+from solver import getBackend, INFEASIBLE
+
+#******************************************************************************
+# HELPER FUNCTIONS
+#******************************************************************************
+
+def reachableTotals(book, formulation = 'mip2'):
+    """
+    Returns the minimum and maximum reachable total of every nutrient.
+    Input: recipee book, formulation (mip2: at most one recipee per category,
+    mip: any subset of recipee-slots, lp: any non-negative amount of each
+    recipee). mip3 has no nutrient bounds to screen.
+    Output: two vectors following NUTRIENTS.
+    """
+
+    if formulation not in ('lp', 'mip', 'mip2'):
+        raise ValueError("Cannot screen nutrient bounds of formulation %s" % formulation)
+
+    if formulation == 'lp':
+        # Amounts are unbounded: a nutrient grows without limit as soon as
+        # one recipee has it
+        values = np.asarray(book.nutrients, dtype = float).reshape(-1, len(NUTRIENTS))
+        lowest = np.where((values < 0).any(axis = 0), -np.inf, 0.0)
+        highest = np.where((values > 0).any(axis = 0), np.inf, 0.0)
+        return lowest, highest
+
+    values = book.varNutrients()
+
+    if formulation == 'mip':
+        lowest = np.minimum(values, 0).sum(axis = 0)
+        highest = np.maximum(values, 0).sum(axis = 0)
+        return lowest, highest
+
+    lowest = np.zeros(len(NUTRIENTS))
+    highest = np.zeros(len(NUTRIENTS))
+
+    if len(values) == 0:
+        return lowest, highest
+
+    # Per-category extremes with reduceat over variables sorted by category
+    order = np.argsort(book.slot, kind = 'stable')
+    slots = book.slot[order]
+    starts = np.flatnonzero(np.r_[True, slots[1:] != slots[:-1]])
+    sorted_values = values[order]
+
+    lowest += np.minimum(np.minimum.reduceat(sorted_values, starts, axis = 0), 0).sum(axis = 0)
+    highest += np.maximum(np.maximum.reduceat(sorted_values, starts, axis = 0), 0).sum(axis = 0)
+
+    return lowest, highest
+
+
+def boundViolations(lowest, highest, bounds, tolerance = 1e-9):
+    """
+    Returns the nutrient bounds outside the reachable range.
+    Output: list of dictionaries with nutrient, bound (min or max), limit,
+    reachable total and gap.
+    """
+
+    violations = []
+
+    for i, nutrient in enumerate(NUTRIENTS):
+        if nutrient not in bounds:
+            continue
+        lower, upper = bounds[nutrient]
+        if highest[i] < lower - tolerance:
+            violations.append({'nutrient': nutrient, 'bound': 'min',
+                               'limit': lower, 'reachable': float(highest[i]),
+                               'gap': float(lower - highest[i])})
+        if lowest[i] > upper + tolerance:
+            violations.append({'nutrient': nutrient, 'bound': 'max',
+                               'limit': upper, 'reachable': float(lowest[i]),
+                               'gap': float(lowest[i] - upper)})
+
+    return violations
+
+#******************************************************************************
+# SCREENING
+#******************************************************************************
+
+def screen(book, bounds = NUTRITION_BOUNDS, formulation = 'mip2', lp = True,
+           model = None, reachable = None):
+    """
+    Screens nutrient bounds before solving.
+    Input: recipee book, nutrient bounds, formulation (lp, mip or mip2), whether
+    to run the LP relaxation check when every row is reachable, the model to
+    relax (built if missing), precomputed reachableTotals.
+    Output: dictionary with feasible (False when proven infeasible, None when
+    the MIP may still be infeasible), violations and lp status.
+    """
+
+    if reachable is None:
+        reachable = reachableTotals(book, formulation)
+    violations = boundViolations(reachable[0], reachable[1], bounds)
+
+    report = {'feasible': None, 'violations': violations, 'lp': None}
+
+    if violations:
+        report['feasible'] = False
+        return report
+
+    if lp:
+        if model is None:
+            model = buildModel(book, formulation, bounds)
+        relaxed = copy.copy(model)
+        relaxed.integrality = np.zeros(model.numVars(), dtype = int)
+        solution = getBackend('highs').solve(relaxed)
+        report['lp'] = solution.status
+        if solution.status == INFEASIBLE:
+            report['feasible'] = False
+
+    return report
+
+
+def printScreening(report):
+    """
+    Prints a screening report.
+    """
+
+    if report['feasible'] is False:
+        print('\nScreening: the bounds cannot be satisfied')
+    for row in report['violations']:
+        print('%(nutrient)s %(bound)s %(limit)g: reachable %(reachable)g, gap %(gap)g' % row)
+    if report['lp'] == INFEASIBLE and not report['violations']:
+        print('LP relaxation is infeasible')
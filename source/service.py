@@ -0,0 +1,452 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Local menu planning service (HTTP/JSON over asyncio, standard library only).
+The catalog and the base model of every formulation are built once and
+handed to a bounded pool of worker processes; a request only swaps in its
+profile's bounds (or intake) before solving. Identical concurrent requests
+share one solve, a model solved before is answered from the on-disk solution
+cache, every request carries its own time limit, and latency statistics are
+kept for a local load generator.
+
+    POST /plan   {"formulation": "mip2", "profile": "name",
+                  "bounds": {"energia": [1800, 2700]}, "intake": {...},
+                  "time_limit": 10}
+    GET  /stats
+    GET  /health
+
+Usage: python service.py serve --path DATA --port 8080 --workers 4
+       python service.py load --port 8080 --requests 500 --concurrency 32
+"""
+
+import os
+import json
+import time
+import asyncio
+import argparse
+import collections
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from Recipee import PATH, CACHE, RECETARIO
+from profiles import Profile, loadProfiles, NUTRITION_BOUNDS, NUTRIENT_INTAKE, INFINITY
+from model_builder import buildModel, FORMULATIONS
+from solver import getBackend, INFEASIBLE
+from screening import reachableTotals, screen
+from batch import profileModel
+from solution_cache import SolutionCache, cachedSolve, SOLUTIONS
+
+HOST = '127.0.0.1'
+PORT = 8080
+
+# Time added to a request's time limit before it is answered with a timeout
+GRACE = 5.0
+
+# Worker state, set once per process by initWorker
+WORKER = {}
+
+#******************************************************************************
+# WORKERS
+#******************************************************************************
+
+def initWorker(book, models, backend, solutions = None):
+    """
+    Stores the book, the base model of every formulation and the solution
+    cache (directory, None for no cache) in the worker.
+    """
+
+    WORKER['book'] = book
+    WORKER['models'] = models
+    WORKER['backend'] = getBackend(backend)
+    WORKER['cache'] = SolutionCache(solutions) if solutions is not None else None
+    WORKER['reachable'] = dict((f, reachableTotals(book, f)) for f in ('lp', 'mip', 'mip2'))
+
+
+def solveRequest(formulation, profile, time_limit):
+    """
+    Solves one request in a worker.
+    Output: result dictionary.
+    """
+
+    book = WORKER['book']
+
+    if formulation in WORKER['reachable']:
+        report = screen(book, profile.bounds, formulation, False,
+                        reachable = WORKER['reachable'][formulation])
+        if report['feasible'] is False:
+            return {'status': INFEASIBLE, 'objVal': None, 'menu': [],
+                    'solve_time': 0.0, 'screening': report['violations']}
+
+    model = profileModel(WORKER['models'][formulation], book, formulation, profile)
+    if WORKER['cache'] is None:
+        solution = WORKER['backend'].solve(model, time_limit = time_limit)
+    else:
+        solution = cachedSolve(model, WORKER['cache'], WORKER['backend'],
+                               time_limit = time_limit)
+
+    return {'status': solution.status,
+            'objVal': solution.objVal,
+            'menu': solution.selected(model.names),
+            'solve_time': solution.solve_time,
+            'cached': solution.cached}
+
+#******************************************************************************
+# SERVICE CLASS
+#******************************************************************************
+
+class Service:
+    """
+    Class to serve menu planning requests.
+    """
+
+    def __init__(self, book, backend = 'highs', workers = None, profiles = None,
+                 time_limit = 30.0, max_pending = 1000, solutions = None):
+        """
+        Initialize the service and start the worker pool.
+        Input: recipee book, solver backend, worker processes, dictionary
+        name -> Profile, default and maximum time limit per request, maximum
+        requests waiting for a worker, solution cache directory shared by the
+        workers (None to always solve).
+        """
+
+        self.book = book
+        self.profiles = profiles or {}
+        self.time_limit = time_limit
+        self.max_pending = max_pending
+        models = dict((f, buildModel(book, f)) for f in FORMULATIONS)
+
+        # Spawned (not forked) workers do not inherit the client sockets of
+        # the server; they are all started here, before the first request
+        workers = workers or os.cpu_count()
+        self.pool = ProcessPoolExecutor(workers, multiprocessing.get_context('spawn'),
+                                        initWorker, (book, models, backend, solutions))
+        for future in [self.pool.submit(os.getpid) for i in range(workers)]:
+            future.result()
+
+        self.pending = {}      # request key -> future of the running solve
+        self.stats = collections.Counter()
+        self.latency = collections.deque(maxlen = 10000)
+        self.started = time.time()
+
+
+    def close(self):
+        """
+        Stops the worker pool.
+        """
+        self.pool.shutdown(cancel_futures = True)
+
+
+    def profile(self, request):
+        """
+        Returns the Profile of a request: a named profile, then bounds and
+        intake overrides (null bounds mean no bound).
+        """
+
+        name = request.get('profile')
+        if name is not None and name not in self.profiles:
+            raise ValueError('Unknown profile %s' % name)
+        base = self.profiles[name] if name is not None else Profile('default')
+
+        bounds = dict(base.bounds)
+        for nutrient, (lower, upper) in request.get('bounds', {}).items():
+            if nutrient not in NUTRITION_BOUNDS:
+                raise ValueError('Unknown nutrient %s' % nutrient)
+            bounds[nutrient] = [-INFINITY if lower is None else float(lower),
+                                INFINITY if upper is None else float(upper)]
+
+        intake = dict(base.intake)
+        for nutrient, value in request.get('intake', {}).items():
+            if nutrient not in NUTRIENT_INTAKE:
+                raise ValueError('Unknown nutrient %s' % nutrient)
+            intake[nutrient] = float(value)
+
+        return Profile(name or 'request', bounds, intake)
+
+
+    async def plan(self, request):
+        """
+        Solves a planning request, sharing the solve of an identical request
+        already running.
+        Output: result dictionary.
+        """
+
+        formulation = request.get('formulation', 'mip2')
+        if formulation not in FORMULATIONS:
+            raise ValueError('Unknown formulation %s' % formulation)
+        time_limit = float(request.get('time_limit', self.time_limit))
+        # The limit goes to the backend, the worker stops with it
+        if not time_limit > 0:
+            raise ValueError('Time limit must be positive, not %s' % time_limit)
+        time_limit = min(time_limit, self.time_limit)
+        profile = self.profile(request)
+
+        key = json.dumps([formulation, profile.bounds, profile.intake, time_limit],
+                         sort_keys = True, default = str)
+
+        future = self.pending.get(key)
+        coalesced = future is not None
+
+        if coalesced:
+            self.stats['coalesced'] += 1
+        else:
+            if len(self.pending) >= self.max_pending:
+                self.stats['rejected'] += 1
+                raise OverflowError('Too many pending requests')
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.pool, solveRequest, formulation,
+                                          profile, time_limit)
+            self.pending[key] = future
+            future.add_done_callback(lambda f: self.pending.pop(key, None))
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), time_limit + GRACE)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            raise
+
+        return dict(result, coalesced = coalesced)
+
+
+    def statistics(self):
+        """
+        Returns request counters, throughput and latency percentiles (ms).
+        """
+
+        elapsed = time.time() - self.started
+        stats = dict(self.stats)
+        stats['pending'] = len(self.pending)
+        stats['uptime'] = elapsed
+        stats['throughput'] = self.stats['requests']/elapsed if elapsed > 0 else 0.0
+        if self.latency:
+            latency = np.array(self.latency)*1000
+            for p in (50, 90, 99):
+                stats['p%d_ms' % p] = float(np.percentile(latency, p))
+            stats['max_ms'] = float(latency.max())
+        return stats
+
+
+    async def handle(self, reader, writer):
+        """
+        Serves one HTTP request per connection.
+        """
+
+        t = time.perf_counter()
+        try:
+            method, path, body = await readRequest(reader)
+            self.stats['requests'] += 1
+
+            if method == 'GET' and path == '/health':
+                code, reply = 200, {'status': 'ok'}
+            elif method == 'GET' and path == '/stats':
+                code, reply = 200, self.statistics()
+            elif method == 'POST' and path == '/plan':
+                code, reply = 200, await self.plan(json.loads(body or b'{}'))
+            else:
+                code, reply = 404, {'error': 'not found'}
+        except (ValueError, KeyError, TypeError) as error:
+            code, reply = 400, {'error': str(error)}
+        except OverflowError as error:
+            code, reply = 503, {'error': str(error)}
+        except asyncio.TimeoutError:
+            code, reply = 504, {'error': 'time limit exceeded'}
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+            return
+        except Exception as error:
+            code, reply = 500, {'error': repr(error)}
+
+        if code != 200:
+            self.stats['errors'] += 1
+        reply['latency'] = time.perf_counter() - t
+        self.latency.append(reply['latency'])
+
+        await writeResponse(writer, code, reply)
+
+#******************************************************************************
+# HTTP
+#******************************************************************************
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+           500: 'Internal Server Error', 503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+
+async def readRequest(reader):
+    """
+    Reads an HTTP request.
+    Output: method, path, body bytes.
+    """
+
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError('closed')
+    method, path = line.decode('latin-1').split()[:2]
+
+    length = 0
+    while True:
+        header = await reader.readline()
+        if header in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = header.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+
+    body = await reader.readexactly(length) if length else b''
+    return method, path, body
+
+
+async def writeResponse(writer, code, reply):
+    """
+    Writes a json HTTP response and closes the connection.
+    """
+
+    body = json.dumps(reply, default = float).encode('utf-8')
+    head = ('HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n'
+            'Content-Length: %d\r\nConnection: close\r\n\r\n'
+            % (code, REASONS.get(code, ''), len(body)))
+    writer.write(head.encode('latin-1') + body)
+    try:
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def httpRequest(host, port, method, path, payload = None):
+    """
+    Sends an HTTP request and returns (status code, json reply).
+    """
+
+    reader, writer = await asyncio.open_connection(host, port)
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    writer.write(('%s %s HTTP/1.1\r\nHost: %s\r\nContent-Length: %d\r\n'
+                  'Connection: close\r\n\r\n' % (method, path, host, len(body))).encode('latin-1') + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    response = await reader.read()
+    writer.close()
+
+    return status, json.loads(response.split(b'\r\n\r\n', 1)[1])
+
+#******************************************************************************
+# SERVER AND LOAD GENERATOR
+#******************************************************************************
+
+async def serve(service, host = HOST, port = PORT):
+    """
+    Runs the service until cancelled.
+    """
+
+    server = await asyncio.start_server(service.handle, host, port, backlog = 1024)
+    print('Serving on http://%s:%d' % (host, port))
+    async with server:
+        await server.serve_forever()
+
+
+async def loadTest(host = HOST, port = PORT, requests = 500, concurrency = 32,
+                   payloads = None):
+    """
+    Sends requests from concurrent clients and measures them.
+    Input: address, number of requests, concurrent clients, list of request
+    payloads used in turn (default: random energy bounds around the default
+    profile, so some requests repeat and coalesce).
+    Output: dictionary with throughput, latency percentiles (ms) and status
+    code counts.
+    """
+
+    if payloads is None:
+        lower, upper = NUTRITION_BOUNDS['energia']
+        payloads = [{'formulation': 'mip3' if i % 2 else 'mip2',
+                     'bounds': {'energia': [lower - 50*i, upper]}}
+                    for i in range(8)]
+
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(payloads[i % len(payloads)])
+
+    latency = []
+    codes = collections.Counter()
+
+    async def client():
+        while not queue.empty():
+            payload = queue.get_nowait()
+            t = time.perf_counter()
+            try:
+                code, reply = await httpRequest(host, port, 'POST', '/plan', payload)
+            except (ConnectionError, OSError):
+                code = 'connection'
+            latency.append(time.perf_counter() - t)
+            codes[code] += 1
+
+    t = time.perf_counter()
+    await asyncio.gather(*[client() for i in range(concurrency)])
+    elapsed = time.perf_counter() - t
+
+    latency = np.array(latency)*1000
+    return {'requests': requests,
+            'concurrency': concurrency,
+            'elapsed': elapsed,
+            'throughput': requests/elapsed,
+            'p50_ms': float(np.percentile(latency, 50)),
+            'p90_ms': float(np.percentile(latency, 90)),
+            'p99_ms': float(np.percentile(latency, 99)),
+            'max_ms': float(latency.max()),
+            'codes': dict((str(code), n) for code, n in codes.items())}
+
+
+def main(argv = None):
+    """
+    Command line entry point.
+    """
+
+    parser = argparse.ArgumentParser(description = 'Menu planning service')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+
+    server = commands.add_parser('serve')
+    server.add_argument('--path', default = PATH)
+    server.add_argument('--recetario', default = RECETARIO)
+    server.add_argument('--no-cache', action = 'store_true')
+    server.add_argument('--solution-cache', default = SOLUTIONS,
+                        help = 'solution cache directory (inside --path)')
+    server.add_argument('--no-solution-cache', action = 'store_true')
+    server.add_argument('--profiles', help = 'csv file of nutrition profiles')
+    server.add_argument('--backend', default = 'highs')
+    server.add_argument('--workers', type = int, default = None)
+    server.add_argument('--time-limit', type = float, default = 30.0)
+    server.add_argument('--host', default = HOST)
+    server.add_argument('--port', type = int, default = PORT)
+
+    load = commands.add_parser('load')
+    load.add_argument('--host', default = HOST)
+    load.add_argument('--port', type = int, default = PORT)
+    load.add_argument('--requests', type = int, default = 500)
+    load.add_argument('--concurrency', type = int, default = 32)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'load':
+        print(json.dumps(asyncio.run(loadTest(args.host, args.port, args.requests,
+                                              args.concurrency)), indent = 2))
+        return
+
+    from planning import Catalog
+    catalog = Catalog(args.path, None if args.no_cache else CACHE, args.recetario,
+                      None)
+    profiles = loadProfiles(args.profiles) if args.profiles else {}
+    solutions = None
+    if not args.no_solution_cache:
+        solutions = os.path.join(args.path, args.solution_cache)
+    service = Service(catalog.book, args.backend, args.workers, profiles,
+                      args.time_limit, solutions = solutions)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Solution cache. A solved model is stored on disk under a fingerprint of
+everything that determines its answer (recipee matrix, bounds, category
+structure, objective, variable names and solver backend), so a repeated
+request returns the stored menu without solving, and any change of the
+inputs gives a different key. The cache directory is bounded in size and
+evicts the least recently used entries.
+"""
+
+import os
+import hashlib
+
+import numpy as np
+
+from solver import Solution, getBackend, OPTIMAL, INFEASIBLE, UNBOUNDED
+
+# Only final answers are cached (a time limit result may improve later)
+CACHEABLE = (OPTIMAL, INFEASIBLE, UNBOUNDED)
+
+# Default cache directory, inside the data directory
+SOLUTIONS = 'soluciones'
+
+#******************************************************************************
+# HELPER FUNCTIONS
+#******************************************************************************
+
+def modelFingerprint(model, backend = ''):
+    """
+    Returns the sha256 hex digest of a matrix model and a backend name.
+    """
+
+    digest = hashlib.sha256()
+    A = model.A.tocsr()
+    A.sort_indices()
+
+    for array in (model.c, A.indptr, A.indices, A.data, model.row_lower,
+                  model.row_upper, model.lb, model.ub, model.integrality):
+        array = np.ascontiguousarray(array)
+        digest.update(str(array.dtype).encode())
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+
+    digest.update(repr((model.sense, float(model.offset), backend)).encode())
+    if model.names is not None:
+        digest.update('\n'.join(model.names).encode('utf-8'))
+
+    return digest.hexdigest()
+
+#******************************************************************************
+# SOLUTION CACHE
+#******************************************************************************
+
+class SolutionCache:
+    """
+    Size-bounded on-disk cache of solutions, least recently used evicted.
+    """
+
+    def __init__(self, directory, max_bytes = 64*1024*1024):
+        """
+        Initialize the cache.
+        Input: cache directory (created if needed), maximum total size.
+        """
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+
+    def path(self, key):
+        """
+        Returns file name of an entry.
+        """
+        return os.path.join(self.directory, key + '.npz')
+
+
+    def get(self, key):
+        """
+        Returns the cached Solution of a key, or None.
+        """
+
+        filename = self.path(key)
+
+        try:
+            with np.load(filename) as data:
+                x = data['x'] if data['has_x'] else None
+                objVal = float(data['objVal']) if data['has_x'] else None
+                solution = Solution(str(data['status']), x, objVal,
+                                    float(data['build_time']),
+                                    float(data['solve_time']),
+                                    str(data['backend']))
+        except (IOError, OSError, KeyError, ValueError):
+            self.misses += 1
+            return None
+
+        # Access time for LRU is kept in the modification time
+        os.utime(filename, None)
+        solution.cached = True
+        self.hits += 1
+
+        return solution
+
+
+    def put(self, key, solution):
+        """
+        Stores a Solution and evicts old entries if the cache is too large.
+        """
+
+        has_x = solution.x is not None
+        filename = self.path(key)
+        # Worker processes may share the directory
+        temp = '%s.%d.tmp' % (filename, os.getpid())
+
+        with open(temp, 'wb') as data:
+            np.savez(data,
+                     status = np.array(solution.status),
+                     has_x = np.array(has_x),
+                     x = np.asarray(solution.x if has_x else [], dtype = float),
+                     objVal = np.array(solution.objVal if has_x else np.nan, dtype = float),
+                     build_time = np.array(solution.build_time),
+                     solve_time = np.array(solution.solve_time),
+                     backend = np.array(str(solution.backend)))
+
+        os.replace(temp, filename)
+        self.evict()
+
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits max_bytes.
+        """
+
+        entries = []
+        total = 0
+
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.npz'):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+    def clear(self):
+        """
+        Removes every entry.
+        """
+
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.npz'):
+                os.remove(os.path.join(self.directory, filename))
+
+
+def cachedSolve(model, cache, backend = 'highs', **options):
+    """
+    Solves a matrix model through a SolutionCache.
+    Output: Solution; solution.cached tells whether it came from the cache.
+    """
+
+    backend = getBackend(backend)
+    key = modelFingerprint(model, backend.name)
+
+    solution = cache.get(key)
+    if solution is not None:
+        return solution
+
+    solution = backend.solve(model, **options)
+    if solution.status in CACHEABLE:
+        cache.put(key, solution)
+
+    return solution
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Solver abstraction. A menu planning model is given in matrix form (objective
+vector, sparse constraint matrix, row and column bounds) and solved by a
+pluggable backend: Gurobi (gurobipy, imported lazily) or the open-source
+HiGHS MILP solver through scipy.optimize.milp.
+"""
+
+import time
+
+import numpy as np
+from scipy import sparse
+
+INFINITY = float('inf')
+
+MINIMIZE = 'min'
+MAXIMIZE = 'max'
+
+# Solution status
+OPTIMAL = 'optimal'
+INFEASIBLE = 'infeasible'
+UNBOUNDED = 'unbounded'
+TIME_LIMIT = 'time_limit'
+FEASIBLE = 'feasible'
+ERROR = 'error'
+
+#******************************************************************************
+# MATRIX MODEL
+#******************************************************************************
+
+class MatrixModel:
+    """
+    Linear model: optimize c.x + offset subject to
+    row_lower <= A.x <= row_upper, lb <= x <= ub, x integer where integrality.
+    """
+
+    def __init__(self, c, A, row_lower, row_upper, lb = None, ub = None,
+                 integrality = None, sense = MINIMIZE, names = None,
+                 row_names = None, offset = 0.0, name = 'menu'):
+        """
+        Initialize a model.
+        Input: objective vector, sparse constraint matrix, row bounds,
+        variable bounds (default [0, inf)), integrality vector (1 integer,
+        0 continuous; default continuous), sense, variable and row names.
+        """
+
+        self.c = np.asarray(c, dtype = float)
+        n = len(self.c)
+        self.A = sparse.csr_matrix(A, shape = (A.shape[0], n))
+        self.row_lower = np.asarray(row_lower, dtype = float)
+        self.row_upper = np.asarray(row_upper, dtype = float)
+        self.lb = np.zeros(n) if lb is None else np.asarray(lb, dtype = float)
+        self.ub = np.full(n, INFINITY) if ub is None else np.asarray(ub, dtype = float)
+        if integrality is None:
+            integrality = np.zeros(n, dtype = int)
+        self.integrality = np.asarray(integrality, dtype = int)
+        self.sense = sense
+        self.names = names
+        self.row_names = row_names
+        self.offset = offset
+        self.name = name
+        self.build_time = 0.0
+
+
+    def numVars(self):
+        """
+        Returns number of variables.
+        """
+        return len(self.c)
+
+
+    def numConstrs(self):
+        """
+        Returns number of constraints.
+        """
+        return self.A.shape[0]
+
+
+class Solution:
+    """
+    Class to contain the result of a solve.
+    """
+
+    def __init__(self, status, x = None, objVal = None, build_time = 0.0,
+                 solve_time = 0.0, backend = None):
+        """
+        Initialize a solution.
+        """
+
+        self.status = status
+        self.x = x
+        self.objVal = objVal
+        self.build_time = build_time
+        self.solve_time = solve_time
+        self.backend = backend
+        self.cached = False
+
+
+    def __str__(self):
+        """
+        As string.
+        """
+
+        return "%s: %s, obj %s (build %.4fs, solve %.4fs)" % (
+            self.backend, self.status, self.objVal, self.build_time,
+            self.solve_time)
+
+
+    def selected(self, names, tolerance = 0.0001):
+        """
+        Returns names of variables with a positive value.
+        """
+
+        if self.x is None:
+            return []
+        return [names[i] for i in np.flatnonzero(self.x > tolerance)]
+
+#******************************************************************************
+# BACKENDS
+#******************************************************************************
+
+class GurobiBackend:
+    """
+    Gurobi backend. gurobipy is only imported when a model is built.
+    """
+
+    name = 'gurobi'
+
+    def build(self, model, verbose = False):
+        """
+        Builds a gurobipy model from a matrix model with the matrix API.
+        Output: gurobipy Model, MVar of variables.
+        """
+
+        import gurobipy as gp
+        from gurobipy import GRB
+
+        m = gp.Model(model.name)
+        m.Params.OutputFlag = 1 if verbose else 0
+
+        vtype = np.where(model.integrality > 0, GRB.INTEGER, GRB.CONTINUOUS)
+        binary = (model.integrality > 0) & (model.lb == 0) & (model.ub == 1)
+        vtype[binary] = GRB.BINARY
+
+        x = m.addMVar(model.numVars(), lb = model.lb, ub = model.ub,
+                      obj = model.c, vtype = vtype)
+        m.ObjCon = model.offset
+        m.ModelSense = GRB.MAXIMIZE if model.sense == MAXIMIZE else GRB.MINIMIZE
+
+        lower, upper = model.row_lower, model.row_upper
+        equal = lower == upper
+        below = ~equal & np.isfinite(upper)
+        above = ~equal & np.isfinite(lower)
+
+        for rows, sense, rhs in ((equal, '=', lower), (below, '<', upper),
+                                 (above, '>', lower)):
+            if rows.any():
+                m.addMConstr(model.A[rows], x, sense, rhs[rows])
+
+        m.update()
+
+        # Model row of each gurobi constraint (ranges give two constraints)
+        order = np.concatenate([np.flatnonzero(equal), np.flatnonzero(below),
+                                np.flatnonzero(above)])
+        m._rows = order
+
+        if model.names is not None:
+            m.setAttr('VarName', x.tolist(), list(model.names))
+        if model.row_names is not None:
+            m.setAttr('ConstrName', m.getConstrs(),
+                      [model.row_names[i] for i in order])
+
+        return m, x
+
+
+    def solve(self, model, time_limit = None, start = None, verbose = False):
+        """
+        Solves a matrix model.
+        Input: matrix model, time limit in seconds, MIP start vector.
+        """
+
+        t = time.time()
+        m, x = self.build(model, verbose)
+        build_time = time.time() - t
+
+        if time_limit is not None:
+            m.Params.TimeLimit = time_limit
+        if start is not None:
+            x.Start = np.asarray(start, dtype = float)
+
+        t = time.time()
+        m.optimize()
+        solve_time = time.time() - t
+
+        return self.solution(m, x, build_time, solve_time)
+
+
+    def solution(self, m, x, build_time, solve_time):
+        """
+        Reads a Solution from a solved gurobipy model.
+        """
+
+        from gurobipy import GRB
+
+        status = {GRB.OPTIMAL: OPTIMAL,
+                  GRB.INFEASIBLE: INFEASIBLE,
+                  GRB.INF_OR_UNBD: INFEASIBLE,
+                  GRB.UNBOUNDED: UNBOUNDED,
+                  GRB.TIME_LIMIT: TIME_LIMIT}.get(m.Status, ERROR)
+
+        values = objVal = None
+        if m.SolCount > 0:
+            values = np.asarray(x.X)
+            objVal = m.ObjVal
+
+        return Solution(status, values, objVal, build_time, solve_time,
+                        self.name)
+
+
+class HighsBackend:
+    """
+    Open-source HiGHS backend through scipy.optimize.milp.
+    MIP starts are not supported by scipy and are ignored.
+    """
+
+    name = 'highs'
+
+    def solve(self, model, time_limit = None, start = None, verbose = False):
+        """
+        Solves a matrix model.
+        Input: matrix model, time limit in seconds, MIP start (ignored).
+        """
+
+        from scipy.optimize import milp, Bounds, LinearConstraint
+
+        t = time.time()
+        sign = -1.0 if model.sense == MAXIMIZE else 1.0
+        constraints = []
+        if model.numConstrs() > 0:
+            constraints.append(LinearConstraint(model.A, model.row_lower,
+                                                model.row_upper))
+        options = {'disp': verbose}
+        if time_limit is not None:
+            options['time_limit'] = time_limit
+        build_time = time.time() - t
+
+        t = time.time()
+        result = milp(sign*model.c, integrality = model.integrality,
+                      bounds = Bounds(model.lb, model.ub),
+                      constraints = constraints, options = options)
+        solve_time = time.time() - t
+
+        status = {0: OPTIMAL, 1: TIME_LIMIT, 2: INFEASIBLE,
+                  3: UNBOUNDED}.get(result.status, ERROR)
+
+        values = objVal = None
+        if result.x is not None:
+            values = np.asarray(result.x)
+            objVal = float(np.dot(model.c, values)) + model.offset
+
+        return Solution(status, values, objVal, build_time, solve_time,
+                        self.name)
+
+
+class LocalSearchBackend:
+    """
+    Solver-free simulated annealing over the category slots (mip2, mip3),
+    see local_search. Menus are feasible at best, never proven optimal.
+    """
+
+    name = 'local'
+
+    def __init__(self, processes = 1, restarts = None):
+        """
+        Initialize the backend.
+        Input: worker processes, restarts (default one per process).
+        """
+
+        self.processes = processes
+        self.restarts = restarts
+
+
+    def solve(self, model, time_limit = None, start = None, verbose = False):
+        """
+        Solves a matrix model.
+        Input: matrix model, time budget in seconds (default
+        local_search.BUDGET), starting variable vector.
+        """
+
+        from local_search import localSearch, BUDGET
+
+        solution, report = localSearch(model, BUDGET if time_limit is None else time_limit,
+                                       self.restarts, self.processes, start = start)
+        if verbose:
+            print('Local search: %d restarts, violation %g' % (report['restarts'],
+                                                               report['violation']))
+        return solution
+
+
+BACKENDS = {'gurobi': GurobiBackend,
+            'highs': HighsBackend,
+            'local': LocalSearchBackend}
+
+#******************************************************************************
+# HELPER FUNCTIONS
+#******************************************************************************
+
+def getBackend(backend):
+    """
+    Returns a backend instance from its name (or the instance itself).
+    """
+
+    if isinstance(backend, str):
+        if backend not in BACKENDS:
+            raise ValueError("Unknown solver backend %s" % backend)
+        return BACKENDS[backend]()
+    return backend
+
+
+def solve(model, backend = 'highs', **options):
+    """
+    Solves a matrix model with the given backend.
+    """
+    return getBackend(backend).solve(model, **options)
+
+
+def compareBackends(model, backends = ('highs', 'gurobi'), repeat = 3):
+    """
+    Solves a model repeatedly with each backend.
+    Output: dictionary backend -> list of solutions. Backends that cannot be
+    imported are skipped.
+    """
+
+    results = {}
+
+    for backend in backends:
+        try:
+            results[backend] = [solve(model, backend) for i in range(repeat)]
+        except ImportError:
+            print("Solver backend %s is not available" % backend)
+
+    return results
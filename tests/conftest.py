@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Shared fixtures: a small synthetic recipee book (benchmark.generateCatalog)
+with relaxed nutrient bounds, small enough for HiGHS to solve in a second.
+"""
+
+import os
+import sys
+import shutil
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'source'))
+
+from Recipee import recipeeBuilder
+from benchmark import generateCatalog
+from profiles import NUTRITION_BOUNDS
+
+RECIPEES = 200
+FOODS = 100
+
+
+@pytest.fixture(scope = 'session')
+def catalog(tmp_path_factory):
+    """
+    Directory with the synthetic food tables and recipee book. One recipee
+    is repeated, so pruning has a duplicate to remove.
+    """
+
+    path = str(tmp_path_factory.mktemp('catalog'))
+    directory = generateCatalog(path, RECIPEES, foods = FOODS)
+    first = sorted(os.listdir(directory))[0]
+    shutil.copy(os.path.join(directory, first), os.path.join(directory, 'copia.csv'))
+
+    return path
+
+
+@pytest.fixture
+def tables(catalog):
+    """
+    Freshly parsed recipees, food table and cost table (updates change them
+    in place).
+    """
+    return recipeeBuilder(catalog, None)
+
+
+@pytest.fixture
+def bounds():
+    """
+    Nutrition bounds the synthetic book can meet: 30% of every minimum,
+    three times every maximum.
+    """
+    return dict((nutrient, [lower*0.3, upper*3])
+                for nutrient, (lower, upper) in NUTRITION_BOUNDS.items())
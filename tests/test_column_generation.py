@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Column generation against the solve of the full catalog.
+"""
+
+import pytest
+
+from column_generation import columnGeneration
+from model_builder import Book, buildModel
+from solver import getBackend, OPTIMAL
+
+
+def test_proven_optimum_matches_full(tables, bounds):
+    """
+    A menu proven optimal for the full catalog has the full optimum.
+    """
+
+    book = Book(tables[0])
+    model, solution, report = columnGeneration(book, 'mip2', bounds)
+    full = getBackend('highs').solve(buildModel(book, 'mip2', bounds))
+
+    assert report['proven']
+    assert len(report['columns']) <= book.numVars()
+    assert full.status == solution.status == OPTIMAL
+    assert solution.objVal == pytest.approx(full.objVal)
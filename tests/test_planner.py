@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Incremental updates of the resident planner against a full rebuild.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from Recipee import RECETARIO
+from model_builder import Book, buildModel
+from planner import Planner
+from profiles import Profile
+from recipee_stream import recipeeChunks
+from solver import getBackend, OPTIMAL
+
+
+def test_incremental_update_matches_rebuild(catalog, tables, bounds):
+    """
+    Price and composition updates give the model (and optimum) of the book
+    rebuilt from the updated tables.
+    """
+
+    recipees, food_table, cost_table = tables
+    planner = Planner(recipees, cost_table, 'mip2', Profile('test', bounds),
+                      food_table = food_table)
+    planner.solve()
+
+    priced, corrected = recipees[0].foods[:2]
+    changed = planner.updatePrices({priced: [cost_table[priced][0]*3, cost_table[priced][1]]})
+    changed += planner.updateComposition({corrected: [2*value for value in food_table[corrected]]})
+    assert changed
+    solution = planner.solve()
+
+    # The planner updated the tables in place
+    rebuilt = []
+    for chunk in recipeeChunks(os.path.join(catalog, RECETARIO), food_table, cost_table):
+        rebuilt.extend(chunk)
+    model = buildModel(Book(rebuilt), 'mip2', bounds)
+
+    assert planner.model.names == model.names
+    assert np.allclose(planner.model.c, model.c)
+    assert abs(planner.model.A - model.A).max() < 1e-9
+    assert np.allclose(planner.model.row_lower, model.row_lower)
+    assert np.allclose(planner.model.row_upper, model.row_upper)
+
+    full = getBackend('highs').solve(model)
+    assert solution.status == full.status == OPTIMAL
+    assert solution.objVal == pytest.approx(full.objVal)
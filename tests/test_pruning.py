@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Duplicate and dominated variable pruning keeps the optimum.
+"""
+
+import pytest
+
+from model_builder import Book, buildModel
+from pruning import pruneVariables
+from solver import getBackend, OPTIMAL
+
+
+def test_pruned_optimum_matches_full(tables, bounds):
+    """
+    The model over the kept variables has the optimum of the full model.
+    """
+
+    book = Book(tables[0])
+    kept, report = pruneVariables(book, 'mip2', bounds)
+    assert len(kept) < book.numVars()
+    assert len(kept) + len(report) == book.numVars()
+
+    backend = getBackend('highs')
+    full = backend.solve(buildModel(book, 'mip2', bounds))
+    pruned = backend.solve(buildModel(book, 'mip2', bounds, columns = kept))
+
+    assert full.status == pruned.status == OPTIMAL
+    assert pruned.objVal == pytest.approx(full.objVal)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+MENU PLANNING MATHEMATICAL MODEL
+
+Solution cache hits and invalidation.
+"""
+
+import copy
+
+import numpy as np
+
+from model_builder import Book, buildModel
+from solution_cache import SolutionCache, cachedSolve
+from solver import OPTIMAL
+
+
+def test_hit_returns_stored_solution(tables, bounds, tmp_path):
+    """
+    The second solve of the same model comes from the cache.
+    """
+
+    model = buildModel(Book(tables[0]), 'mip2', bounds)
+    cache = SolutionCache(str(tmp_path))
+
+    first = cachedSolve(model, cache)
+    second = cachedSolve(model, cache)
+
+    assert first.status == OPTIMAL and not first.cached
+    assert second.cached and cache.hits == 1
+    assert second.status == first.status
+    assert second.objVal == first.objVal
+    assert np.array_equal(second.x, first.x)
+
+
+def test_changed_model_misses(tables, bounds, tmp_path):
+    """
+    A new price or new bounds change the fingerprint, the model is solved
+    again.
+    """
+
+    book = Book(tables[0])
+    model = buildModel(book, 'mip2', bounds)
+    cache = SolutionCache(str(tmp_path))
+    cachedSolve(model, cache)
+
+    priced = copy.copy(model)
+    priced.c = model.c.copy()
+    priced.c[0] += 1.0
+    assert not cachedSolve(priced, cache).cached
+
+    tighter = dict(bounds)
+    tighter['proteina'] = [bounds['proteina'][0] + 1, bounds['proteina'][1]]
+    assert not cachedSolve(buildModel(book, 'mip2', tighter), cache).cached
+
+    assert cachedSolve(model, cache).cached